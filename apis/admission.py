@@ -0,0 +1,131 @@
+"""
+Контроль допуска для /orders/assign под перегрузкой.
+
+Каждый процесс пропускает в assign_order не больше ASSIGN_MAX_CONCURRENCY запросов одновременно, остальные
+ждут в очереди не дольше ASSIGN_QUEUE_BUDGET секунд и затем получают 503 с Retry-After. Ограничение работает
+только в потоковых воркерах gunicorn (GUNICORN_THREADS больше ASSIGN_MAX_CONCURRENCY); синхронный воркер
+и так выполняет один запрос, и для него действует только ведро токенов. Каждому курьеру выделено ведро
+токенов (ASSIGN_RATE в секунду, не больше ASSIGN_BURST), сверх него - 429 с Retry-After.
+Вёдра тоже свои в каждом процессе, так что курьер в худшем случае получает ASSIGN_RATE * число воркеров.
+Повтор с Idempotency-Key отвечается сохранённым ответом до контроля допуска и токен не тратит,
+а ключ резервируется только для допущенного запроса.
+"""
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency, queue_budget, rate, burst, max_buckets=100000):
+        self.queue_budget = queue_budget
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed_overload = 0
+        self.shed_rate_limited = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(max_concurrency=settings.ASSIGN_MAX_CONCURRENCY,
+                   queue_budget=settings.ASSIGN_QUEUE_BUDGET,
+                   rate=settings.ASSIGN_RATE,
+                   burst=settings.ASSIGN_BURST)
+
+    def take_token(self, key):
+        """
+        Возвращает 0, если токен выдан, иначе число секунд до появления следующего токена
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(key, None) or TokenBucket(self.burst, now)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            # least recently used buckets are evicted first, a fresh bucket is full anyway
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return 0
+            self.shed_rate_limited += 1
+            return (1 - bucket.tokens) / self.rate
+
+    def acquire(self):
+        with self._lock:
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=self.queue_budget)
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.in_flight += 1
+                self.admitted += 1
+            else:
+                self.shed_overload += 1
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "admitted": self.admitted,
+                "shed_overload": self.shed_overload,
+                "shed_rate_limited": self.shed_rate_limited,
+            }
+
+
+@functools.lru_cache(maxsize=None)
+def assign_controller():
+    return AdmissionController.from_settings()
+
+
+def retry_after(seconds):
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+def admission_controlled(view_method):
+    """
+    Декоратор метода ViewSet: ограничивает частоту запросов курьера и число одновременных вызовов
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        controller = assign_controller()
+        wait = controller.take_token(str(request.data.get("courier_id")))
+        if wait:
+            return Response(status=status.HTTP_429_TOO_MANY_REQUESTS, headers=retry_after(wait))
+        if not controller.acquire():
+            return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE, headers=retry_after(controller.queue_budget))
+        try:
+            return view_method(self, request, *args, **kwargs)
+        finally:
+            controller.release()
+
+    return wrapper
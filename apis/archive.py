@@ -0,0 +1,78 @@
+"""
+Перенос выполненных развозов в архив.
+
+Перед удалением из рабочих таблиц вклад развозов в рейтинг и заработок добавляется в
+CourierRegionSummary/CourierSummary, поэтому CourierManager.rating и earnings дают тот же результат.
+Развозы одного курьера идут друг за другом, так что архивируется всегда самый ранний отрезок его истории.
+"""
+from django.db import transaction
+from django.db.models import F, Max
+
+from .db_router import use_primary
+from .models import ArchivedOrder, Batch, CourierManager, CourierRegionSummary, CourierSummary, Order
+
+
+def archive_chunk(before, chunk_size):
+    """
+    Архивирует до chunk_size развозов, все заказы которых выполнены раньше before.
+    Возвращает число перенесённых развозов
+    """
+    with use_primary(), transaction.atomic():
+        batch_ids = list(Batch.objects.filter(is_complete=True)
+                         .annotate(finished=Max("order__complete_time"))
+                         .filter(finished__lt=before)
+                         .order_by("batch_id")
+                         .values_list("batch_id", flat=True)[:chunk_size])
+        if not batch_ids:
+            return 0
+
+        rows = list(Order.objects.filter(batch_id__in=batch_ids)
+                    .order_by("batch__courier_id", "region", "complete_time")
+                    .values_list("order_id", "weight", "region", "delivery_hours", "complete_time",
+                                 "batch_id", "batch__assign_time", "batch__courier_id", "batch__courier_type"))
+        fold_rating(rows)
+        fold_earnings(Batch.objects.filter(batch_id__in=batch_ids).values_list("courier_id", "courier_type"))
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(order_id=order_id, weight=weight, region=region, delivery_hours=delivery_hours,
+                          complete_time=complete_time, batch_id=batch_id, assign_time=assign_time,
+                          courier_id=courier_id, courier_type=courier_type)
+            for order_id, weight, region, delivery_hours, complete_time, batch_id, assign_time, courier_id, courier_type
+            in rows
+        ])
+        Order.objects.filter(batch_id__in=batch_ids).delete()
+        Batch.objects.filter(batch_id__in=batch_ids).delete()
+    return len(batch_ids)
+
+
+def fold_rating(rows):
+    """
+    Добавляет длительности доставок к сводке по (курьер, регион) так же, как их считает запрос рейтинга:
+    первая доставка в регионе отсчитывается от назначения, остальные - от предыдущей доставки
+    """
+    summaries = {(summary.courier_id, summary.region): summary
+                 for summary in CourierRegionSummary.objects.select_for_update()
+                 .filter(courier_id__in={row[7] for row in rows})}
+    touched = set()
+    for _, _, region, _, complete_time, _, assign_time, courier_id, _ in rows:
+        summary = summaries.get((courier_id, region))
+        if summary is None:
+            summary = summaries[courier_id, region] = CourierRegionSummary(courier_id=courier_id, region=region,
+                                                                            last_complete_time=assign_time)
+        summary.total_seconds += (complete_time - summary.last_complete_time).total_seconds()
+        summary.deliveries += 1
+        summary.last_complete_time = complete_time
+        touched.add((courier_id, region))
+    for key in touched:
+        summaries[key].save()
+
+
+def fold_earnings(batches):
+    earned = {}
+    for courier_id, courier_type in batches:
+        earned[courier_id] = earned.get(courier_id, 0) + 500 * CourierManager.coefs.get(courier_type)
+    for courier_id, earnings in earned.items():
+        summary, _ = CourierSummary.objects.select_for_update().get_or_create(courier_id=courier_id)
+        summary.earnings = F("earnings") + earnings
+        summary.save(update_fields=["earnings"])
+
@@ -0,0 +1,242 @@
+"""
+Лента изменений между процессами через Postgres LISTEN/NOTIFY.
+
+Пул свободных заказов и граф регионов держатся в памяти каждого воркера и устаревают, когда другой воркер
+назначает заказы, снимает их после изменения курьера или правит соседство регионов. Пути записи отправляют
+pg_notify в той же транзакции, поэтому уведомление приходит только после коммита и в порядке коммитов.
+
+У каждого отправителя (процесс и поток, со случайными метками, чтобы переиспользованные pid и идентификаторы
+потоков не сливались со старыми отправителями) своя нумерация событий без пропусков: номер считается закреплённым
+только после коммита, откат не оставляет дыр. Подписчик - фоновый поток с отдельным соединением, который
+собирает уведомления пачками по settings.CHANGEFEED_BATCH_DELAY и применяет их разом. Если номер от
+отправителя пришёл не следующим по порядку или соединение прервалось, часть событий потеряна, и все кеши
+процесса сбрасываются для полной перезагрузки.
+"""
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+CHANNEL = "apis_changes"
+# NOTIFY payloads are limited to 8000 bytes, larger id lists are split
+IDS_PER_EVENT = 500
+
+logger = logging.getLogger(__name__)
+
+handlers = {}
+resets = []
+_local = threading.local()
+
+
+def register(kind, handler):
+    """
+    handler(ids) применяет к кешу процесса все события kind из пачки.
+    Обработчики вызываются в порядке регистрации, поэтому не должны зависеть от порядка событий в пачке
+    """
+    handlers[kind] = handler
+
+
+def register_reset(reset):
+    """
+    reset() сбрасывает кеш процесса целиком, когда события потеряны
+    """
+    resets.append(reset)
+
+
+def new_nonce():
+    return uuid.uuid4().hex[:12]
+
+
+_boot = new_nonce()
+
+
+def process_id():
+    # pids are recycled after a worker restart, the boot nonce keeps a new process from looking like an old one
+    return "%s:%d:%s" % (socket.gethostname(), os.getpid(), _boot)
+
+
+def sender_id():
+    # thread idents are recycled too: every thread gets its own nonce and starts numbering from 1
+    if not hasattr(_local, "nonce"):
+        _local.nonce = new_nonce()
+    return "%s:%s" % (process_id(), _local.nonce)
+
+
+def forked():
+    global _boot
+    _boot = new_nonce()
+    _local.__dict__.clear()
+
+
+class Committed:
+    """
+    Колбэк on_commit, закрепляющий номер события отправителя
+    """
+    __slots__ = ("seq",)
+
+    def __init__(self, seq):
+        self.seq = seq
+
+    def __call__(self):
+        _local.committed = max(getattr(_local, "committed", 0), self.seq)
+
+
+def notify(kind, ids=()):
+    """
+    Рассылает событие другим процессам после коммита текущей транзакции
+    """
+    if not settings.CHANGEFEED:
+        return
+    using = DEFAULT_DB_ALIAS
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    ids = list(ids)
+    chunks = [ids[start:start + IDS_PER_EVENT] for start in range(0, len(ids), IDS_PER_EVENT)] or [[]]
+    for chunk in chunks:
+        # callbacks of rolled back transactions and savepoints are dropped, so their numbers get reused
+        pending = sum(isinstance(callback, Committed) for _, callback in connection.run_on_commit)
+        seq = getattr(_local, "committed", 0) + pending + 1
+        payload = json.dumps({"sender": sender_id(), "seq": seq, "kind": kind, "ids": chunk})
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+        transaction.on_commit(Committed(seq), using=using)
+
+
+class Subscriber(threading.Thread):
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        super().__init__(name="changefeed", daemon=True)
+        self.using = using
+        self.seen = {}
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.connection = None
+
+    def connect(self):
+        import psycopg2
+
+        wrapper = connections[self.using]
+        self.connection = psycopg2.connect(**wrapper.get_connection_params())
+        self.connection.autocommit = True
+        with self.connection.cursor() as cursor:
+            cursor.execute("LISTEN %s" % CHANNEL)
+
+    def run(self):
+        import psycopg2
+
+        first = True
+        while not self.stopped.is_set():
+            try:
+                self.connect()
+                if not first:
+                    # notifications sent while the connection was down are lost
+                    self.reset()
+                first = False
+                self.ready.set()
+                self.listen()
+            except psycopg2.Error:
+                logger.exception("change feed connection lost")
+                self.ready.set()
+                self.stopped.wait(1)
+            finally:
+                if self.connection is not None:
+                    self.connection.close()
+        connections.close_all()
+
+    def listen(self):
+        while not self.stopped.is_set():
+            if not self.wait(settings.CHANGEFEED_TIMEOUT):
+                continue
+            # give notifications of neighbouring commits a moment to arrive and apply them together
+            deadline = time.monotonic() + settings.CHANGEFEED_BATCH_DELAY
+            while time.monotonic() < deadline and self.wait(deadline - time.monotonic()):
+                pass
+            events = [json.loads(notify.payload) for notify in self.connection.notifies]
+            self.connection.notifies.clear()
+            try:
+                self.apply(events)
+            except Exception:
+                logger.exception("change feed batch failed, reloading caches")
+                self.reset()
+
+    def wait(self, timeout):
+        if select.select([self.connection], [], [], max(timeout, 0)) == ([], [], []):
+            return False
+        self.connection.poll()
+        return True
+
+    def apply(self, events):
+        """
+        Применяет пачку событий от других процессов; при пропуске номера сбрасывает кеши
+        """
+        own = process_id()
+        batch = defaultdict(set)
+        gap = False
+        for event in events:
+            sender, seq = event["sender"], event["seq"]
+            if sender.rsplit(":", 1)[0] == own:
+                continue
+            last = self.seen.get(sender)
+            if last is not None and seq <= last:
+                continue
+            # the first event of an unknown sender is taken as is: earlier ones are in the loaded snapshot
+            if last is not None and seq != last + 1:
+                gap = True
+            self.seen[sender] = seq
+            batch[event["kind"]].update(event["ids"])
+        if gap:
+            logger.warning("change feed gap detected, reloading caches")
+            self.reset()
+            return
+        # handlers run in registration order, not in the order events arrived
+        for kind, handler in handlers.items():
+            if kind in batch:
+                handler(sorted(batch[kind]))
+
+    def reset(self):
+        for reset in resets:
+            reset()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+_subscriber = None
+_subscriber_lock = threading.Lock()
+
+
+def listen():
+    """
+    Запускает подписчика процесса, если он ещё не запущен, и ждёт выполнения LISTEN.
+    Вызывается перед загрузкой кеша, чтобы изменения после снимка не потерялись
+    """
+    global _subscriber
+    if not settings.CHANGEFEED or connections[DEFAULT_DB_ALIAS].vendor != "postgresql":
+        return
+    with _subscriber_lock:
+        # after fork the thread of the parent process does not exist in the child
+        if _subscriber is None or not _subscriber.is_alive():
+            _subscriber = Subscriber()
+            _subscriber.start()
+    _subscriber.ready.wait()
+
+
+def stop():
+    global _subscriber
+    with _subscriber_lock:
+        if _subscriber is not None:
+            _subscriber.stop()
+            _subscriber = None
+
+
+# gunicorn forks workers from a preloaded master: children must not share its sender identity
+os.register_at_fork(after_in_child=forked)
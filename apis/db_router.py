@@ -0,0 +1,86 @@
+"""
+Маршрутизация запросов между основной базой и read-репликами.
+
+Чтения уходят на реплики (DATABASES с именем replica*), записи и всё, что выполняется внутри use_primary(),
+- на default. Курьер, который только что что-то изменил, на REPLICA_PIN_SECONDS закрепляется за основной базой,
+чтобы следующий GET не прочитал отстающую реплику. Закрепление хранится в общем для всех воркеров кэше
+(DatabaseCache на основной базе), с репликами и кэшем в памяти процесса роутер не запускается.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+PRIMARY = "default"
+# backends that keep the pin inside one worker process or host
+PER_PROCESS_CACHES = ("django.core.cache.backends.locmem.LocMemCache",
+                      "django.core.cache.backends.dummy.DummyCache",
+                      "django.core.cache.backends.filebased.FileBasedCache")
+
+_pinned = contextvars.ContextVar("pinned_to_primary", default=False)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith("replica")]
+
+
+@contextmanager
+def use_primary():
+    """
+    Все чтения внутри блока (или декорированной функции) идут в основную базу
+    """
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def pin_courier(courier_id):
+    cache.set("primary-pin:%s" % courier_id, True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(courier_id):
+    return cache.get("primary-pin:%s" % courier_id, False)
+
+
+class ReplicaRouter:
+    def __init__(self):
+        if replicas() and settings.CACHES["default"]["BACKEND"] in PER_PROCESS_CACHES:
+            raise ImproperlyConfigured("read replicas need a cache shared by all workers for the primary pin, "
+                                       "%s is per process" % settings.CACHES["default"]["BACKEND"])
+
+    def db_for_read(self, model, **hints):
+        available = replicas()
+        # the database cache holds the pin itself, a lagging replica would lose it
+        if _pinned.get() or not available or model._meta.app_label == "django_cache":
+            return PRIMARY
+        return random.choice(available)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class PrimaryPinMiddleware:
+    """
+    Изменяющие запросы целиком выполняются на основной базе, включая чтения внутри них
+    """
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in self.safe_methods:
+            return self.get_response(request)
+        with use_primary():
+            return self.get_response(request)
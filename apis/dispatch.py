@@ -0,0 +1,60 @@
+"""
+Пакетное распределение свободных заказов между всеми свободными курьерами.
+
+Задача с ограничением по весу - обобщённая задача о назначениях (NP-трудная), поэтому решается жадно:
+сначала заказы, подходящие меньшему числу курьеров, среди них - более лёгкие; каждый заказ уходит
+курьеру с наименьшим достаточным остатком грузоподъёмности (best fit).
+"""
+import numpy as np
+
+from . import matching
+
+
+def compatibility(couriers, columns):
+    """
+    Возвращает пары (позиция заказа, позиция курьера) для всех совместимых по региону и времени сочетаний
+    """
+    order_positions, courier_positions = [], []
+    for position, (_, _, regions, working_hours) in enumerate(couriers):
+        work_starts, work_ends = matching.parse_hours(working_hours)
+        mask = np.isin(columns.regions, np.asarray(regions, dtype=np.int64))
+        mask &= matching.fits_by_time(columns, work_starts, work_ends)
+        found = np.flatnonzero(mask)
+        order_positions.append(found)
+        courier_positions.append(np.full(len(found), position))
+    if not order_positions:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(order_positions), np.concatenate(courier_positions)
+
+
+def solve(couriers, columns, max_weight):
+    """
+    couriers - кортежи (courier_id, courier_type, regions, working_hours),
+    max_weight - грузоподъёмность по типу курьера в килограммах.
+    Возвращает {courier_id: [order_id, ...]}
+    """
+    plan = {}
+    order_positions, courier_positions = compatibility(couriers, columns)
+    if not len(order_positions):
+        return plan
+
+    grouping = np.argsort(order_positions, kind="stable")
+    order_positions, courier_positions = order_positions[grouping], courier_positions[grouping]
+    bounds = np.searchsorted(order_positions, np.arange(len(columns) + 1))
+    degree = np.diff(bounds)
+
+    residual = np.array([max_weight.get(courier_type) * matching.WEIGHT_SCALE
+                         for _, courier_type, _, _ in couriers], dtype=np.int64)
+
+    for position in np.lexsort((columns.ids, columns.weights, degree)):
+        if not degree[position]:
+            continue
+        weight = columns.weights[position]
+        candidates = courier_positions[bounds[position]:bounds[position + 1]]
+        candidates = candidates[residual[candidates] >= weight]
+        if not len(candidates):
+            continue
+        chosen = candidates[np.argmin(residual[candidates])]
+        residual[chosen] -= weight
+        plan.setdefault(couriers[chosen][0], []).append(int(columns.ids[position]))
+    return plan
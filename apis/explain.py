@@ -0,0 +1,154 @@
+"""
+Пробный прогон назначения заказов (POST /orders/assign/explain).
+
+Повторяет конвейер OrderManager.assign_order - регион, окна доставки, грузоподъёмность - в том же режиме
+(ORDER_POOL, ASSIGN_PRIORITY, NORMALIZED_SCHEMA), но ничего не пишет: Batch не создаётся, заказы и курьер
+не блокируются. Для каждого этапа возвращаются число оставшихся кандидатов, число и примеры отсеянных заказов,
+время этапа и число и время SQL-запросов, так что пустой или медленный ответ assign можно разобрать по этапам
+прямо на проде. В режиме priority трассируется сам priority.select: прочитанные порции индекса и строки,
+просмотренные заказы, отсеянные по времени и не поместившиеся.
+"""
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+
+from . import matching, normalized, pool, priority, shifts
+from .db_router import PRIMARY, use_primary
+from .models import Batch, Courier, Order
+from .regions import search_tiers
+
+# сколько id отсеянных заказов показывать на этапе
+SAMPLE_SIZE = 10
+
+
+class QueryTimer:
+    """
+    execute_wrapper, который считает запросы и их суммарное время
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - start
+
+
+class Trace:
+    def __init__(self):
+        self.timer = QueryTimer()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        record = {"stage": name}
+        queries, seconds = self.timer.queries, self.timer.seconds
+        start = time.perf_counter()
+        yield record
+        record.update(ms=round((time.perf_counter() - start) * 1000, 3),
+                      queries=self.timer.queries - queries,
+                      sql_ms=round((self.timer.seconds - seconds) * 1000, 3))
+        self.stages.append(record)
+
+
+def rejected(record, ids):
+    record["rejected"] = len(ids)
+    record["rejected_sample"] = ids[:SAMPLE_SIZE].tolist()
+
+
+def mode():
+    if settings.ASSIGN_PRIORITY:
+        return "priority"
+    return "pool" if settings.ORDER_POOL else "weight"
+
+
+def free_columns(tier):
+    if settings.ORDER_POOL:
+        with pool.lock:
+            order_pool = pool.order_pool()
+            alive = order_pool.alive[:order_pool.size]
+            in_tier = np.isin(order_pool.regions[:order_pool.size], np.asarray(tier, dtype=np.int64))
+            return order_pool.columns(np.flatnonzero(alive & in_tier))
+    return normalized.order_columns(Order.objects.filter(region__in=tier, batch_id__isnull=True))
+
+
+def explain_priority(trace, tier, working_hours, max_weight):
+    # the same index scan as assign: only the chunks priority.select actually reads are traced
+    with trace.stage("priority") as record:
+        stats = priority.new_stats()
+        selected = priority.select(tier, working_hours, max_weight, stats)
+        record.update(candidates=len(selected), chunks=stats["chunks"], rows_fetched=stats["rows"],
+                      scanned=stats["scanned"], scan_limit=settings.ASSIGN_PRIORITY_SCAN, max_weight=max_weight)
+        for reason in ("time_rejected", "capacity_skipped"):
+            record[reason] = len(stats[reason])
+            record[reason + "_sample"] = stats[reason][:SAMPLE_SIZE]
+    return selected
+
+
+def explain_tier(trace, tier, working_hours, max_weight):
+    if settings.ASSIGN_PRIORITY:
+        return explain_priority(trace, tier, working_hours, max_weight)
+    with trace.stage("region") as record:
+        columns = free_columns(tier)
+        record["candidates"] = len(columns)
+    with trace.stage("time") as record:
+        work_starts, work_ends = matching.parse_hours(working_hours)
+        fits = matching.fits_by_time(columns, work_starts, work_ends) if len(columns) else np.zeros(0, dtype=bool)
+        record["candidates"] = int(fits.sum())
+        rejected(record, columns.ids[~fits])
+    with trace.stage("capacity") as record:
+        selected = matching.fill_capacity(columns.ids[fits], columns.weights[fits], max_weight * matching.WEIGHT_SCALE)
+        record["candidates"] = len(selected)
+        record["max_weight"] = max_weight
+        record["selected_weight"] = int(columns.weights[np.isin(columns.ids, selected)].sum()) / matching.WEIGHT_SCALE
+        rejected(record, columns.ids[fits][~np.isin(columns.ids[fits], selected)])
+    return selected.tolist()
+
+
+@use_primary()
+def explain_assignment(courier_id):
+    """
+    Трассировка того, что сделал бы assign_order для курьера; None, если курьера нет
+    """
+    try:
+        courier_id = int(courier_id)
+    except (TypeError, ValueError):
+        return None
+    started = time.perf_counter()
+    trace = Trace()
+    result = {"courier_id": courier_id, "mode": mode(), "open_batch": None, "tiers": [], "orders": []}
+    with connections[PRIMARY].execute_wrapper(trace.timer):
+        with trace.stage("courier"):
+            courier = Courier.objects.filter(pk=courier_id).first()
+            if courier is None:
+                return None
+            batch = Batch.objects.filter(courier_id=courier.courier_id, is_complete=False).first()
+        result["stages"] = trace.stages
+        if batch:
+            # assign_order would return the open batch as is
+            result["open_batch"] = batch.batch_id
+            result["orders"] = list(Order.objects.filter(batch_id=batch.batch_id, complete_time__isnull=True)
+                                    .order_by("order_id").values_list("order_id", flat=True))
+        else:
+            max_weight = Order.order_manager.max_weight.get(courier.courier_type)
+            with trace.stage("shifts") as record:
+                working_hours = shifts.courier_hours(courier)
+                record["working_hours"] = working_hours
+            for tier in search_tiers(courier.regions):
+                trace.stages = []
+                selected = explain_tier(trace, tier, working_hours, max_weight)
+                result["tiers"].append({"regions": sorted(tier), "stages": trace.stages})
+                if selected:
+                    result["orders"] = sorted(selected)
+                    break
+    result.update(total_ms=round((time.perf_counter() - started) * 1000, 3), queries=trace.timer.queries,
+                  sql_ms=round(trace.timer.seconds * 1000, 3))
+    return result
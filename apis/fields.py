@@ -0,0 +1,43 @@
+"""
+Поля моделей, не привязанные к Postgres.
+
+На Postgres ArrayField остаётся нативным массивом, на остальных движках (SQLite в CI и локальных бенчмарках)
+список хранится JSON-строкой в текстовой колонке. Валидация элементов, формы и сериализаторы DRF работают
+так же, как у django.contrib.postgres.fields.ArrayField, поиск внутри массива (__contains и т.п.)
+доступен только на Postgres.
+"""
+import json
+
+from django.contrib.postgres import fields
+
+
+class ArrayField(fields.ArrayField):
+    def db_type(self, connection):
+        if connection.vendor == "postgresql":
+            return super().db_type(connection)
+        return "text"
+
+    def cast_db_type(self, connection):
+        if connection.vendor == "postgresql":
+            return super().cast_db_type(connection)
+        return "text"
+
+    def get_placeholder(self, value, compiler, connection):
+        if connection.vendor == "postgresql":
+            return super().get_placeholder(value, compiler, connection)
+        return "%s"
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if connection.vendor == "postgresql" or value is None:
+            return value
+        return json.dumps(value)
+
+    def _from_db_value(self, value, expression, connection):
+        if isinstance(value, str) and connection.vendor != "postgresql":
+            value = json.loads(value)
+        if value is None or not hasattr(self.base_field, "from_db_value"):
+            return value
+        return [self.base_field.from_db_value(item, expression, connection) for item in value]
+
+    from_db_value = _from_db_value
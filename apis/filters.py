@@ -0,0 +1,38 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .serializers import sparse_fields
+
+
+def boolean(value):
+    if value not in ("true", "false"):
+        raise ValueError(value)
+    return value == "true"
+
+
+class QueryParamFilter(BaseFilterBackend):
+    """
+    Фильтрация списка по query-параметрам из view.filter_params: {параметр: (lookup, преобразование)}.
+    Каждому параметру соответствует индексированная колонка, чтобы фильтр не превращался в полный скан
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        lookups = {}
+        for param, (lookup, parse) in getattr(view, "filter_params", {}).items():
+            if param not in request.query_params:
+                continue
+            try:
+                lookups[lookup] = parse(request.query_params[param])
+            except ValueError:
+                raise ValidationError({param: "invalid value"})
+        return queryset.filter(**lookups)
+
+
+class SparseFieldsFilter(BaseFilterBackend):
+    """
+    Читает из базы только поля, запрошенные в ?fields=
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        fields = sparse_fields(request, {field.name for field in queryset.model._meta.concrete_fields})
+        return queryset.only(*fields) if fields else queryset
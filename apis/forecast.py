@@ -0,0 +1,117 @@
+"""
+Прогноз пропускной способности регионов по истории доставок.
+
+Для каждой пары (регион, час суток) хранится скетч распределения длительности доставки: фиксированный
+набор логарифмических корзин (как в DDSketch) с относительной погрешностью квантилей RELATIVE_ACCURACY.
+Размер скетча не зависит от числа доставок, а два скетча объединяются сложением корзин.
+"""
+import math
+from array import array
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from . import models
+
+RELATIVE_ACCURACY = 0.05
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+# 128 buckets cover durations from 1 second to about four days
+BUCKETS = 128
+
+
+class DurationSketch:
+    __slots__ = ("counts",)
+
+    def __init__(self, counts=None):
+        self.counts = array("I", counts if counts is not None else bytes(4 * BUCKETS))
+
+    @classmethod
+    def from_bytes(cls, data):
+        sketch = cls()
+        if data:
+            sketch.counts = array("I")
+            sketch.counts.frombytes(bytes(data))
+        return sketch
+
+    def to_bytes(self):
+        return self.counts.tobytes()
+
+    def add(self, seconds):
+        index = 0 if seconds <= 1 else min(BUCKETS - 1, math.ceil(math.log(seconds, GAMMA)))
+        self.counts[index] += 1
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        return self
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def quantile(self, q):
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen > rank:
+                # middle of the bucket (GAMMA^(i-1), GAMMA^i] in the relative sense
+                return 2 * GAMMA ** index / (GAMMA + 1)
+        return 2 * GAMMA ** (BUCKETS - 1) / (GAMMA + 1)
+
+
+def delivery_seconds(order):
+    """
+    Длительность доставки: от предыдущего выполненного заказа развоза или от назначения развоза
+    """
+    complete_time = order.complete_time
+    if isinstance(complete_time, str):
+        complete_time = parse_datetime(complete_time)
+    previous = models.Order.objects.filter(batch_id=order.batch_id, complete_time__lt=complete_time) \
+        .order_by("-complete_time").values_list("complete_time", flat=True).first()
+    start = previous or order.batch.assign_time
+    return complete_time, max(0.0, (complete_time - start).total_seconds())
+
+
+def record_delivery(order):
+    """
+    Добавляет выполненный заказ в скетч его региона и часа
+    """
+    complete_time, seconds = delivery_seconds(order)
+    with transaction.atomic():
+        forecast, _ = models.RegionForecast.objects.select_for_update() \
+            .get_or_create(region=order.region, hour=complete_time.hour)
+        sketch = DurationSketch.from_bytes(forecast.sketch)
+        sketch.add(seconds)
+        forecast.sketch = sketch.to_bytes()
+        forecast.deliveries += 1
+        forecast.total_seconds += seconds
+        forecast.save(update_fields=["sketch", "deliveries", "total_seconds"])
+
+
+def summary(sketch, deliveries, total_seconds):
+    mean = total_seconds / deliveries if deliveries else None
+    return {
+        "deliveries": deliveries,
+        "mean_seconds": round(mean, 1) if mean is not None else None,
+        "p50_seconds": round(sketch.quantile(0.5), 1) if deliveries else None,
+        "p90_seconds": round(sketch.quantile(0.9), 1) if deliveries else None,
+        # orders one courier is expected to deliver per hour
+        "throughput_per_courier": round(3600 / mean, 2) if mean else None,
+    }
+
+
+def region_forecast(region):
+    hours = []
+    day = DurationSketch()
+    deliveries = total_seconds = 0
+    for forecast in models.RegionForecast.objects.filter(region=region).order_by("hour"):
+        sketch = DurationSketch.from_bytes(forecast.sketch)
+        hours.append({"hour": forecast.hour, **summary(sketch, forecast.deliveries, forecast.total_seconds)})
+        day.merge(sketch)
+        deliveries += forecast.deliveries
+        total_seconds += forecast.total_seconds
+    return {"region": region, "hours": hours, "day": summary(day, deliveries, total_seconds)}
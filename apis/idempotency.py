@@ -0,0 +1,143 @@
+"""
+Поддержка заголовка Idempotency-Key для POST-эндпоинтов.
+
+Первый запрос с ключом резервирует запись в IdempotencyKey (уникальный индекс по хешу ключа и пути
+делает это безопасным для нескольких воркеров), выполняет обработчик и сохраняет ответ.
+Повтор с тем же ключом получает сохранённый ответ одним запросом к базе, не выполняя обработчик.
+Резерв без ответа старше IDEMPOTENCY_LEASE считается брошенным (воркер убит по таймауту или OOM),
+и повтор забирает его себе вместо 409 до истечения TTL. Ответы 5xx не сохраняются, и ключ остаётся свободным
+для повтора. Над контролем допуска ставится replayed: он только читает сохранённый ответ, а резервирует ключ
+idempotent уже после допуска, так что сброшенный под перегрузкой запрос не пишет в базу.
+"""
+import datetime
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .db_router import use_primary
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+def digest(*parts):
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def expired_before():
+    return timezone.now() - datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def replay(record, request_hash):
+    if record.request_hash != request_hash:
+        return Response(data={"detail": "Idempotency-Key was used with a different request"},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.status_code is None:
+        return Response(data={"detail": "request with this Idempotency-Key is in progress"},
+                        status=status.HTTP_409_CONFLICT, headers={"Retry-After": "1"})
+    return Response(data=record.response, status=record.status_code)
+
+
+def abandoned(record, request_hash):
+    lease_start = timezone.now() - datetime.timedelta(seconds=settings.IDEMPOTENCY_LEASE)
+    return record.status_code is None and record.request_hash == request_hash and record.created_time < lease_start
+
+
+def take_over(record):
+    # only one of the concurrent retries renews the lease
+    return IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True, created_time=record.created_time) \
+        .update(created_time=timezone.now()) == 1
+
+
+def hashes(request):
+    """
+    (хеш ключа, хеш тела запроса) или None, если заголовка нет
+    """
+    key = request.headers.get(HEADER)
+    if not key:
+        return None
+    return digest(request.path, key), digest(json.dumps(request.data, sort_keys=True, default=str))
+
+
+def stored(key_hash, request_hash):
+    """
+    Сохранённый ответ (или 409/422) без записи в базу; None, если ключ свободен или брошен
+    """
+    record = IdempotencyKey.objects.filter(key_hash=key_hash, created_time__gte=expired_before()).first()
+    if record is None or abandoned(record, request_hash):
+        return None
+    return replay(record, request_hash)
+
+
+def reserve(key_hash, request_hash):
+    """
+    Возвращает сохранённый ответ, если ключ уже использовался, иначе резервирует ключ и возвращает None
+    """
+    record = IdempotencyKey.objects.filter(key_hash=key_hash, created_time__gte=expired_before()).first()
+    if record:
+        if abandoned(record, request_hash) and take_over(record):
+            return None
+        return replay(record, request_hash)
+    IdempotencyKey.objects.filter(key_hash=key_hash, created_time__lt=expired_before()).delete()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(key_hash=key_hash, request_hash=request_hash)
+    except IntegrityError:
+        # another worker reserved the key between the lookup and the insert
+        return replay(IdempotencyKey.objects.get(key_hash=key_hash), request_hash)
+    return None
+
+
+def idempotent(view_method):
+    """
+    Декоратор метода ViewSet: повторный запрос с тем же Idempotency-Key возвращает первый ответ
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        request_hashes = hashes(request)
+        if request_hashes is None:
+            return view_method(self, request, *args, **kwargs)
+
+        key_hash, request_hash = request_hashes
+        with use_primary():
+            stored = reserve(key_hash, request_hash)
+            if stored is not None:
+                return stored
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except Exception:
+                IdempotencyKey.objects.filter(key_hash=key_hash).delete()
+                raise
+            if response.status_code >= 500:
+                IdempotencyKey.objects.filter(key_hash=key_hash).delete()
+            else:
+                IdempotencyKey.objects.filter(key_hash=key_hash).update(status_code=response.status_code,
+                                                                        response=response.data)
+        return response
+
+    return wrapper
+
+
+def replayed(view_method):
+    """
+    Декоратор метода ViewSet: повтор с сохранённым ответом отвечается сразу, одним чтением; ключ не резервируется
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        request_hashes = hashes(request)
+        if request_hashes is not None:
+            with use_primary():
+                response = stored(*request_hashes)
+            if response is not None:
+                return response
+        return view_method(self, request, *args, **kwargs)
+
+    return wrapper
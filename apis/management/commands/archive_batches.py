@@ -0,0 +1,25 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apis.archive import archive_chunk
+
+
+class Command(BaseCommand):
+    help = "Переносит выполненные развозы старше N дней в архив, сохраняя рейтинг и заработок курьеров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - datetime.timedelta(days=options["days"])
+        total = 0
+        while True:
+            archived = archive_chunk(before, options["chunk_size"])
+            if not archived:
+                break
+            total += archived
+            self.stdout.write("archived %d batches" % total)
+        self.stdout.write("done, %d batches archived" % total)
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apis.models import Courier
+from apis.notifications import broker, courier_channel
+from apis.streaming import EventStreamRouter
+
+
+async def not_django(scope, receive, send):
+    raise RuntimeError("only the event stream is benchmarked")
+
+
+class IdleClient:
+    """
+    Клиент потока событий без сети: ничего не отправляет и только считает полученные события
+    """
+    __slots__ = ("closed", "events")
+
+    def __init__(self):
+        self.closed = asyncio.Event()
+        self.events = 0
+
+    async def receive(self):
+        await self.closed.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message.get("body", b"").startswith(b"event:"):
+            self.events += 1
+
+
+async def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.01)
+
+
+async def idle_connections(count, courier_id, timeout=60):
+    """
+    Открывает count простаивающих соединений GET /couriers/{id}/events в одном процессе, публикует одно событие
+    и ждёт, пока его получат все. Возвращает память на соединение и время раздачи события
+    """
+    application = EventStreamRouter(not_django)
+    scope = {"type": "http", "method": "GET", "path": "/couriers/%d/events" % courier_id}
+    channel = courier_channel(courier_id)
+    subscribed = broker().subscribers()
+    clients = [IdleClient() for _ in range(count)]
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(application(scope, client.receive, client.send)) for client in clients]
+        await wait_for(lambda: broker().subscribers() - subscribed >= count, timeout)
+        connect_seconds = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    message = json.dumps({"event": "benchmark"})
+    started = time.perf_counter()
+    # published from a worker thread, as the API does after a commit
+    await asyncio.get_running_loop().run_in_executor(None, broker().publish, channel, message)
+    await wait_for(lambda: all(client.events for client in clients), timeout)
+    fanout_seconds = time.perf_counter() - started
+
+    for client in clients:
+        client.closed.set()
+    await asyncio.gather(*tasks)
+    return {"connections": count,
+            "bytes_per_connection": memory // count,
+            "connect_ms": round(connect_seconds * 1000, 1),
+            "fanout_ms": round(fanout_seconds * 1000, 1)}
+
+
+class Command(BaseCommand):
+    help = "Держит N простаивающих соединений потока событий в одном процессе и замеряет память и раздачу события"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=10000)
+        parser.add_argument("--courier", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not Courier.objects.filter(pk=options["courier"]).exists():
+            raise CommandError("courier %d does not exist" % options["courier"])
+        result = asyncio.run(idle_connections(options["connections"], options["courier"]))
+        self.stdout.write(json.dumps(result))
@@ -0,0 +1,78 @@
+import itertools
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apis import matching
+from apis.pool import OrderPool
+from apis.models import OrderManager, select_orders_by_time
+
+
+def random_hours(rnd):
+    start = rnd.randrange(0, 20 * 60, 30)
+    end = start + rnd.randrange(30, 4 * 60, 30)
+    return "%02d:%02d-%02d:%02d" % (start // 60, start % 60, end // 60, end % 60)
+
+
+def legacy_match(rows, regions, working_hours, max_weight):
+    """
+    Прежний построчный алгоритм из assign_order: фильтр по времени и накопленный вес в Python
+    """
+    regions = set(regions)
+    fits = sorted((row for row in rows if row[1] in regions and select_orders_by_time(working_hours, row[3])),
+                  key=lambda row: (row[2], row[0]))
+    result, total = [], 0
+    for weight, group in itertools.groupby(fits, key=lambda row: row[2]):
+        group = [row[0] for row in group]
+        total += weight * len(group)
+        if total > max_weight:
+            break
+        result.extend(group)
+    return result
+
+
+class Command(BaseCommand):
+    help = "Сравнивает время подбора заказов построчным и векторизованным алгоритмами"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        rows = [(order_id, rnd.randint(1, 50), rnd.randint(1, 5000) / 100,
+                 [random_hours(rnd) for _ in range(rnd.randint(1, 3))])
+                for order_id in range(1, options["size"] + 1)]
+        regions = list(range(1, 26))
+        working_hours = ["09:00-13:00", "15:00-19:00"]
+        max_weight = OrderManager.max_weight["car"]
+
+        legacy = self.measure(options["repeat"], lambda: legacy_match(rows, regions, working_hours, max_weight))
+        build = self.measure(options["repeat"], lambda: matching.OrderColumns.from_rows(rows))
+        columns = matching.OrderColumns.from_rows(rows)
+        kernel = self.measure(options["repeat"], lambda: matching.match(columns, regions, working_hours, max_weight))
+
+        pool = OrderPool()
+        pool.add(rows)
+        pooled = self.measure(options["repeat"], lambda: pool.match(regions, working_hours, max_weight))
+
+        if legacy[1] != kernel[1].tolist() or sorted(legacy[1]) != sorted(pooled[1].tolist()):
+            self.stderr.write("results differ")
+        self.stdout.write("orders:           %d" % options["size"])
+        self.stdout.write("legacy:           %.4f s" % legacy[0])
+        self.stdout.write("columns build:    %.4f s" % build[0])
+        self.stdout.write("kernel:           %.4f s" % kernel[0])
+        self.stdout.write("pool:             %.4f s, %.1f MB" % (pooled[0], pool.nbytes / 2 ** 20))
+        self.stdout.write("speedup (kernel): %.0fx" % (legacy[0] / kernel[0]))
+        self.stdout.write("speedup (total):  %.0fx" % (legacy[0] / (build[0] + kernel[0])))
+
+    @staticmethod
+    def measure(repeat, func):
+        best, result = float("inf"), None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - started)
+        return best, result
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apis.models import Order
+
+
+class Command(BaseCommand):
+    help = "Распределяет свободные заказы между всеми курьерами без открытого развоза"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0,
+                            help="повторять распределение каждые N секунд (0 - выполнить один раз)")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            plan = Order.order_manager.dispatch_idle()
+            self.stdout.write("assigned %d orders to %d couriers in %.3f s" % (
+                sum(map(len, plan.values())), len(plan), time.perf_counter() - started))
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
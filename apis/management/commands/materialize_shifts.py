@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apis.models import AvailabilityWindow, Courier
+from apis.shifts import day_start, materialize
+
+
+class Command(BaseCommand):
+    help = "Пересобирает интервалы доступности курьеров (AvailabilityWindow) на горизонт SHIFT_HORIZON_DAYS " \
+           "и удаляет прошедшие; запускать раз в сутки"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        pruned, _ = AvailabilityWindow.objects.filter(end__lte=day_start(today)).delete()
+        total = 0
+        chunk = []
+        for courier in Courier.objects.order_by("pk").only("courier_id", "regions", "working_hours") \
+                .iterator(chunk_size=options["chunk_size"]):
+            chunk.append(courier)
+            if len(chunk) == options["chunk_size"]:
+                total += materialize(chunk, today, options["days"])
+                chunk = []
+        if chunk:
+            total += materialize(chunk, today, options["days"])
+        self.stdout.write("AvailabilityWindow: %d rows materialized, %d past rows removed" % (total, pruned))
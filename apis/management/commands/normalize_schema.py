@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apis.models import Courier, Order
+from apis.normalized import sync_courier_regions, sync_order_windows
+
+
+class Command(BaseCommand):
+    help = "Заполняет таблицы нормализованной схемы (CourierRegion, OrderWindow) по массивам курьеров и заказов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model, sync in ((Courier, sync_courier_regions), (Order, sync_order_windows)):
+            total = 0
+            chunk = []
+            for instance in model.objects.order_by("pk").iterator(chunk_size=options["chunk_size"]):
+                chunk.append(instance)
+                if len(chunk) == options["chunk_size"]:
+                    total += self.sync(sync, chunk)
+                    chunk = []
+            total += self.sync(sync, chunk)
+            self.stdout.write("%s: %d rows normalized" % (model.__name__, total))
+
+    @staticmethod
+    def sync(sync, chunk):
+        with transaction.atomic():
+            sync(chunk)
+        return len(chunk)
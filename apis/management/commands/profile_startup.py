@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apis.startup import heaviest_imports
+
+
+class Command(BaseCommand):
+    help = "Замеряет холодный старт воркера: импорт приложений, middleware, URLconf и первый запрос"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--settings-module", action="append", dest="modules",
+                            help="профиль настроек, можно указать несколько раз")
+        parser.add_argument("--method", default="POST")
+        parser.add_argument("--path", default="/orders/assign")
+        parser.add_argument("--data", default='{"courier_id": 1}')
+
+    def handle(self, *args, **options):
+        modules = options["modules"] or ["candy_delivery_app.settings", "candy_delivery_app.settings_api"]
+        request = {"method": options["method"], "path": options["path"], "data": json.loads(options["data"])}
+        for module in modules:
+            self.report(module, self.probe(module, request))
+
+    def probe(self, module, request):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=module, PROFILE_REQUEST=json.dumps(request))
+        # a fresh interpreter per profile, otherwise modules imported by this command would not be counted
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "from apis.startup import probe; probe()"],
+            env=env, capture_output=True, text=True,
+        )
+        if process.returncode:
+            raise CommandError("%s: %s" % (module, process.stderr.splitlines()[-1:]))
+        result = json.loads(process.stdout)
+        result["heaviest_imports"] = heaviest_imports(process.stderr)
+        return result
+
+    def report(self, module, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(module))
+        self.stdout.write("  django.setup: %.1f ms" % result["setup_ms"])
+        for app, times in result["apps_ms"].items():
+            self.stdout.write("    %s: %s" % (app, ", ".join("%s %.1f ms" % item for item in times.items()) or "-"))
+        self.stdout.write("  heaviest imports:")
+        for name, elapsed in result["heaviest_imports"]:
+            self.stdout.write("    %s: %.1f ms" % (name, elapsed))
+        self.stdout.write("  middleware:")
+        for path, elapsed in result["middleware_ms"].items():
+            self.stdout.write("    %s: %.1f ms" % (path, elapsed))
+        self.stdout.write("  urlconf: %.1f ms" % result["urlconf_ms"])
+        self.stdout.write("  preload: %.1f ms" % result["preload_ms"])
+        for attempt in ("first_request", "second_request"):
+            self.stdout.write("  %s: %.1f ms (%d)" % (attempt.replace("_", " "), result[attempt + "_ms"],
+                                                    result[attempt + "_status"]))
+        self.stdout.write("  cold start total: %.1f ms" % result["total_ms"])
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from apis.idempotency import expired_before
+from apis.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Удаляет сохранённые ответы для просроченных Idempotency-Key"
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(created_time__lt=expired_before()).delete()
+        self.stdout.write("deleted %d keys" % deleted)
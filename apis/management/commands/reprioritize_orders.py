@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apis.models import Order
+from apis.priority import priority_key
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает priority_key свободных заказов, например после изменения ASSIGN_PRIORITY_WEIGHTS"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = 0
+        chunk = []
+        queryset = Order.objects.filter(batch__isnull=True).order_by("pk") \
+            .only("order_id", "delivery_hours", "priority", "created_time", "priority_key")
+        for order in queryset.iterator(chunk_size=options["chunk_size"]):
+            order.priority_key = priority_key(order.priority, order.created_time, order.delivery_hours)
+            chunk.append(order)
+            if len(chunk) == options["chunk_size"]:
+                total += self.update(chunk)
+                chunk = []
+        total += self.update(chunk)
+        self.stdout.write("Order: %d priority keys updated" % total)
+
+    @staticmethod
+    def update(chunk):
+        with transaction.atomic():
+            Order.objects.bulk_update(chunk, ["priority_key"])
+        return len(chunk)
@@ -0,0 +1,116 @@
+"""
+Векторизованное ядро подбора заказов для курьера.
+
+Заказы представляются параллельными массивами NumPy (без создания экземпляров моделей),
+а проверки региона, пересечения интервалов и суммарного веса выполняются целиком над массивами.
+"""
+import itertools
+
+import numpy as np
+
+# вес хранится в сотых долях килограмма, чтобы не сравнивать float с лимитом
+WEIGHT_SCALE = 100
+
+MINUTES_PER_DAY = 24 * 60
+HOURS_TEMPLATE = np.frombuffer(b"00:00-00:00", dtype=np.uint8)
+HOURS_LENGTH = len(HOURS_TEMPLATE)
+
+
+def parse_hours(hours):
+    """
+    Переводит строки вида "HH:MM-HH:MM" в два массива минут от начала суток;
+    на строке другого формата или со временем за пределами суток бросает ValueError
+    """
+    raw = np.array(hours, dtype="S")
+    if raw.size and raw.dtype.itemsize != HOURS_LENGTH:
+        # shorter strings are padded with NUL and fail the character checks below, longer ones are caught here
+        raise ValueError("time data %r does not match format 'HH:MM-HH:MM'"
+                         % next(value for value in hours if len(value) != HOURS_LENGTH))
+    chars = raw.astype("S%d" % HOURS_LENGTH).view(np.uint8).reshape(-1, HOURS_LENGTH)
+    digits = chars.astype(np.int32) - ord("0")
+    starts = (digits[:, 0] * 10 + digits[:, 1]) * 60 + digits[:, 3] * 10 + digits[:, 4]
+    ends = (digits[:, 6] * 10 + digits[:, 7]) * 60 + digits[:, 9] * 10 + digits[:, 10]
+    # every digit is folded to "0", so the row has to match the template exactly
+    shape = np.where((digits >= 0) & (digits <= 9), ord("0"), chars)
+    valid = (shape == HOURS_TEMPLATE).all(axis=1) & (digits[:, 3] < 6) & (digits[:, 9] < 6) \
+        & (starts <= MINUTES_PER_DAY) & (ends <= MINUTES_PER_DAY)
+    if not valid.all():
+        raise ValueError("time data %r does not match format 'HH:MM-HH:MM'" % hours[int(np.argmin(valid))])
+    return starts, ends
+
+
+class OrderColumns:
+    """
+    Колоночное представление набора заказов: по массиву на поле и плоский список окон доставки,
+    где owners[i] - позиция заказа, которому принадлежит i-е окно
+    """
+    __slots__ = ("ids", "regions", "weights", "owners", "starts", "ends")
+
+    def __init__(self, ids, regions, weights, owners, starts, ends):
+        self.ids = ids
+        self.regions = regions
+        self.weights = weights
+        self.owners = owners
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Строит колонки из кортежей (order_id, region, weight, delivery_hours)
+        """
+        rows = list(rows)
+        if not rows:
+            empty = np.empty(0, dtype=np.int64)
+            return cls(empty, empty, empty, empty, empty, empty)
+        ids, regions, weights, hours = zip(*rows)
+        lengths = np.fromiter(map(len, hours), dtype=np.int64, count=len(hours))
+        starts, ends = parse_hours(list(itertools.chain.from_iterable(hours)))
+        return cls(ids=np.array(ids, dtype=np.int64),
+                   regions=np.array(regions, dtype=np.int64),
+                   weights=np.rint(np.array(weights, dtype=np.float64) * WEIGHT_SCALE).astype(np.int64),
+                   owners=np.repeat(np.arange(len(ids)), lengths),
+                   starts=starts,
+                   ends=ends)
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        return cls.from_rows(queryset.values_list("order_id", "region", "weight", "delivery_hours"))
+
+
+def fits_by_time(columns, work_starts, work_ends):
+    """
+    Маска заказов, у которых хотя бы одно окно доставки пересекается с рабочими часами
+    """
+    hit = ((columns.starts[:, None] < np.asarray(work_ends)[None, :]) &
+           (columns.ends[:, None] > np.asarray(work_starts)[None, :])).any(axis=1)
+    mask = np.zeros(len(columns), dtype=bool)
+    mask[columns.owners[hit]] = True
+    return mask
+
+
+def fill_capacity(ids, weights, capacity):
+    """
+    Отбирает самые лёгкие заказы, пока накопленный вес не превышает capacity (в сотых долях).
+    Заказы с одинаковым весом берутся или не берутся вместе - так же, как оконная SUM(...) OVER(ORDER BY weight)
+    """
+    order = np.lexsort((ids, weights))
+    sorted_weights = weights[order]
+    cumulative = np.cumsum(sorted_weights)
+    peers_end = np.searchsorted(sorted_weights, sorted_weights, side="right") - 1
+    return ids[order][cumulative[peers_end] <= capacity]
+
+
+def match(columns, regions, working_hours, max_weight):
+    """
+    Возвращает id заказов, которые подходят курьеру по региону, времени и грузоподъёмности
+    """
+    if not len(columns):
+        return columns.ids
+    work_starts, work_ends = parse_hours(working_hours)
+    mask = np.isin(columns.regions, np.asarray(regions, dtype=np.int64))
+    mask &= fits_by_time(columns, work_starts, work_ends)
+    return fill_capacity(columns.ids[mask], columns.weights[mask], max_weight * WEIGHT_SCALE)
@@ -1,6 +1,8 @@
 # Generated by Django 3.1.7 on 2021-03-28 21:21
 
-import django.contrib.postgres.fields
+# apis.fields.ArrayField replaced django.contrib.postgres.fields.ArrayField here so the schema can be created
+# on SQLite; on Postgres it emits the same integer[] / varchar(15)[] columns, so applied databases are unaffected
+import apis.fields
 import django.core.validators
 from django.db import migrations, models
 import django.db.models.deletion
@@ -29,8 +31,8 @@ class Migration(migrations.Migration):
             fields=[
                 ('courier_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
                 ('courier_type', models.CharField(choices=[('foot', 'foot'), ('bike', 'bike'), ('car', 'car')], max_length=4)),
-                ('regions', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=None)),
-                ('working_hours', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=15), size=None)),
+                ('regions', apis.fields.ArrayField(base_field=models.IntegerField(), size=None)),
+                ('working_hours', apis.fields.ArrayField(base_field=models.CharField(max_length=15), size=None)),
             ],
             managers=[
                 ('add_funcs', django.db.models.manager.Manager()),
@@ -42,7 +44,7 @@ class Migration(migrations.Migration):
                 ('order_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
                 ('weight', models.DecimalField(decimal_places=2, max_digits=4, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(50)])),
                 ('region', models.PositiveIntegerField()),
-                ('delivery_hours', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=15), size=None)),
+                ('delivery_hours', apis.fields.ArrayField(base_field=models.CharField(max_length=15), size=None)),
                 ('complete_time', models.DateTimeField(blank=True, null=True)),
                 ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='apis.batch')),
             ],
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.7 on 2026-10-19 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['is_complete', 'batch_id'], name='apis_batch_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['region', 'order_id'], name='apis_order_region_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.1.7 on 2026-10-19 15:55
+
+import apis.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0002_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('order_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('weight', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('region', models.PositiveIntegerField()),
+                ('delivery_hours', apis.fields.ArrayField(base_field=models.CharField(max_length=15), size=None)),
+                ('complete_time', models.DateTimeField()),
+                ('batch_id', models.PositiveIntegerField(db_index=True)),
+                ('assign_time', models.DateTimeField(null=True)),
+                ('courier_id', models.PositiveIntegerField(db_index=True)),
+                ('courier_type', models.CharField(max_length=4, null=True)),
+                ('archived_time', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourierSummary',
+            fields=[
+                ('courier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='apis.courier')),
+                ('earnings', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourierRegionSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.PositiveIntegerField()),
+                ('deliveries', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+                ('last_complete_time', models.DateTimeField()),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apis.courier')),
+            ],
+            options={
+                'unique_together': {('courier', 'region')},
+            },
+        ),
+    ]
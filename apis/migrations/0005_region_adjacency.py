@@ -0,0 +1,24 @@
+# Generated by Django 3.1.7 on 2026-10-19 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0004_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegionAdjacency',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.PositiveIntegerField()),
+                ('neighbour', models.PositiveIntegerField()),
+            ],
+            options={
+                'unique_together': {('region', 'neighbour')},
+            },
+        ),
+    ]
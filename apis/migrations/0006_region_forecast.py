@@ -0,0 +1,28 @@
+# Generated by Django 3.1.7 on 2026-10-19 16:00
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0005_region_adjacency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegionForecast',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.PositiveIntegerField()),
+                ('hour', models.PositiveSmallIntegerField(validators=[django.core.validators.MaxValueValidator(23)])),
+                ('sketch', models.BinaryField(default=bytes)),
+                ('deliveries', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+            ],
+            options={
+                'unique_together': {('region', 'hour')},
+            },
+        ),
+    ]
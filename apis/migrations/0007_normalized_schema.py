@@ -0,0 +1,35 @@
+# Generated by Django 3.1.7 on 2026-10-19 16:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0006_region_forecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderWindow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.SmallIntegerField()),
+                ('end', models.SmallIntegerField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='windows', to='apis.order')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourierRegion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.PositiveIntegerField()),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='region_rows', to='apis.courier')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='courierregion',
+            index=models.Index(fields=['region', 'courier'], name='apis_courier_region_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.7 on 2026-10-19 16:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0007_normalized_schema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='created_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='priority',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='priority_key',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(batch__isnull=True), fields=['region', '-priority_key', 'order_id'], name='apis_order_priority_idx'),
+        ),
+    ]
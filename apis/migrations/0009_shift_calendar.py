@@ -0,0 +1,70 @@
+# Generated by Django 3.1.7 on 2026-10-19 16:20
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0008_order_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShiftTemplate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(validators=[django.core.validators.MaxValueValidator(6)])),
+                ('start', models.SmallIntegerField()),
+                ('end', models.SmallIntegerField()),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shift_templates', to='apis.courier')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ShiftOverride',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start', models.SmallIntegerField(blank=True, null=True)),
+                ('end', models.SmallIntegerField(blank=True, null=True)),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shift_overrides', to='apis.courier')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AvailabilityWindow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.PositiveIntegerField()),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='apis.courier')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='shiftoverride',
+            index=models.Index(fields=['courier', 'date'], name='apis_shift_override_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='availabilitywindow',
+            index=models.Index(fields=['region', 'start'], name='apis_availability_region_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='availabilitywindow',
+            index=models.Index(fields=['courier', 'start'], name='apis_availability_courier_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='shiftoverride',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('end__isnull', True), ('start__isnull', True)), models.Q(('end__isnull', False), ('end__lte', 1440), ('start__gte', 0), ('start__isnull', False), ('start__lt', django.db.models.expressions.F('end'))), _connector='OR'), name='apis_shift_override_interval'),
+        ),
+        migrations.AddConstraint(
+            model_name='shifttemplate',
+            constraint=models.CheckConstraint(check=models.Q(weekday__lte=6), name='apis_shift_template_weekday'),
+        ),
+        migrations.AddConstraint(
+            model_name='shifttemplate',
+            constraint=models.CheckConstraint(check=models.Q(('end__lte', 1440), ('start__gte', 0), ('start__lt', django.db.models.expressions.F('end'))), name='apis_shift_template_interval'),
+        ),
+    ]
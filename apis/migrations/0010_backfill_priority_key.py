@@ -0,0 +1,37 @@
+from django.db import migrations
+
+CHUNK_SIZE = 1000
+# the formula and the default ASSIGN_PRIORITY_WEIGHTS as of this migration; it must not follow later changes of
+# apis.priority or the settings. With other weights run manage.py reprioritize_orders afterwards
+WEIGHTS = {"priority": 60, "age": 1, "deadline": 1}
+
+
+def priority_key(priority, created_time, delivery_hours):
+    deadline = max((int(hours[6:8]) * 60 + int(hours[9:11]) for hours in delivery_hours), default=0)
+    created = int(created_time.timestamp() // 60)
+    return WEIGHTS["priority"] * priority - WEIGHTS["age"] * created - WEIGHTS["deadline"] * deadline
+
+
+def backfill(apps, schema_editor):
+    # rows that existed before 0008 got priority_key=0 and would outrank every new order
+    Order = apps.get_model("apis", "Order")
+    chunk = []
+    for order in Order.objects.filter(batch__isnull=True).order_by("pk") \
+            .only("order_id", "delivery_hours", "priority", "created_time").iterator(chunk_size=CHUNK_SIZE):
+        order.priority_key = priority_key(order.priority, order.created_time, order.delivery_hours)
+        chunk.append(order)
+        if len(chunk) == CHUNK_SIZE:
+            Order.objects.bulk_update(chunk, ["priority_key"])
+            chunk = []
+    Order.objects.bulk_update(chunk, ["priority_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0009_shift_calendar'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.7 on 2026-10-19 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0010_backfill_priority_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(complete_time__isnull=True), fields=['order_id'], name='apis_order_open_idx'),
+        ),
+    ]
@@ -1,11 +1,17 @@
 import itertools
 import time
 
-from django.contrib.postgres.fields import ArrayField
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import connection
+from django.db import NotSupportedError, connections, router, transaction
 from django.db import models
-from django.db.models import Sum, Window, F
+from django.utils import timezone
+
+from . import dispatch, forecast, matching, normalized, notifications, pool, priority, shifts
+from .db_router import use_primary
+from .fields import ArrayField
+from .regions import reachable, search_tiers
 
 
 def timecheck(a, b):
@@ -22,6 +28,8 @@ class OrderManager(models.Manager):
     max_weight = {'foot': 10,
                   'bike': 15,
                   'car': 50}
+    # how many times assign matches again when everything it picked was claimed concurrently
+    claim_attempts = 3
 
     def check_batches(self, **kwargs):
         try:
@@ -30,27 +38,31 @@ class OrderManager(models.Manager):
             batch = None
         return batch
 
+    @use_primary()
     def check_after_update(self, courier):
         batch = self.check_batches(courier_id=courier.courier_id, is_complete=False)
         if batch:
-            orders = Order.objects.filter(batch_id=batch.batch_id, region__in=courier.regions)
-            orders = [order.order_id for order in orders if
-                      select_orders_by_time(courier.working_hours, order.delivery_hours)]
-            weighted = Order.objects.filter(order_id__in=orders).annotate(sum_weight=Window(expression=Sum('weight'),
-                                                                                            order_by=F("weight").asc()))
-            good_orders = [i.order_id for i in weighted if i.sum_weight <= self.max_weight.get(courier.courier_type)]
+            columns = normalized.order_columns(Order.objects.filter(batch_id=batch.batch_id))
+            good_orders = matching.match(columns, reachable(courier.regions), shifts.courier_hours(courier),
+                                         self.max_weight.get(courier.courier_type)).tolist()
 
-            Order.objects.filter(batch_id=batch.batch_id) \
-                .exclude(order_id__in=good_orders) \
-                .update(batch_id=None)
+            removed = Order.objects.filter(batch_id=batch.batch_id).exclude(order_id__in=good_orders)
+            removed_ids = list(removed.values_list("order_id", flat=True))
+            if removed_ids:
+                pool.track_added(removed.values_list("order_id", "region", "weight", "delivery_hours"))
+                removed.update(batch_id=None)
+                notifications.publish(courier.courier_id, "removed", orders=removed_ids)
 
             # deletes batch if all orders from it are deleted
             if not Order.objects.filter(batch_id=batch.batch_id).exists():
                 batch.delete()
 
+    @use_primary()
+    @transaction.atomic
     def assign_order(self, courier_id):
         try:
-            courier = Courier.objects.get(pk=courier_id)
+            # the lock keeps assign and dispatch_idle from opening two batches for one courier
+            courier = Courier.objects.select_for_update().get(pk=courier_id)
         except:
             return None
         batch = self.check_batches(courier_id=courier.courier_id, is_complete=False)
@@ -58,70 +70,230 @@ class OrderManager(models.Manager):
             orders = Order.objects.filter(batch_id=batch.batch_id, complete_time__isnull=True)
             return orders, batch.assign_time
         else:
-            try:
-                orders = Order.objects.filter(region__in=courier.regions, batch_id__isnull=True) \
-                    .order_by("weight")
-            except:
+            working_hours = shifts.courier_hours(courier)
+            max_weight = self.max_weight.get(courier.courier_type)
+            for attempt in range(self.claim_attempts):
+                correct_ids = self.match_orders(courier.regions, working_hours, max_weight)
+                if not correct_ids:
+                    return []
+                batch, claimed_ids = self.claim(courier.courier_id, courier.courier_type, correct_ids)
+                # orders the pool still had but another worker already claimed leave the pool as well
+                pool.track_claimed(correct_ids)
+                if batch is not None:
+                    break
+                # a stale pool offered only taken orders: forget them right away and match again
+                pool.apply_claimed(correct_ids)
+            else:
                 return []
+            notifications.publish(courier.courier_id, "assigned", orders=claimed_ids, assign_time=batch.assign_time)
+            return Order.objects.filter(batch_id=batch.batch_id), batch.assign_time
 
-            orders = [order.order_id for order in orders if
-                      select_orders_by_time(courier.working_hours, order.delivery_hours)]
+    @staticmethod
+    def match_orders(regions, working_hours, max_weight):
+        # own regions first, then neighbouring ones if ASSIGN_NEIGHBOUR_HOPS allows widening
+        for tier in search_tiers(regions):
+            if settings.ASSIGN_PRIORITY:
+                correct_ids = priority.select(tier, working_hours, max_weight)
+            elif settings.ORDER_POOL:
+                with pool.lock:
+                    correct_ids = pool.order_pool().match(tier, working_hours, max_weight).tolist()
+            else:
+                orders = Order.objects.filter(region__in=tier, batch_id__isnull=True)
+                correct_ids = matching.match(normalized.order_columns(orders),
+                                             tier, working_hours, max_weight).tolist()
+            if correct_ids:
+                return correct_ids
+        return []
 
-            if not orders:
-                return []
+    @staticmethod
+    def claim(courier_id, courier_type, order_ids):
+        """
+        Открывает развоз и забирает в него те из order_ids, что ещё свободны. Возвращает развоз и id реально
+        забранных заказов; если все заказы уже забрал другой запрос, пустой развоз не остаётся - (None, [])
+        """
+        batch = Batch.objects.create(courier_id=courier_id, courier_type=courier_type)
+        claimed = Order.objects.filter(pk__in=order_ids, batch_id__isnull=True).update(batch_id=batch.batch_id)
+        if not claimed:
+            batch.delete()
+            return None, []
+        if claimed != len(order_ids):
+            order_ids = list(Order.objects.filter(batch_id=batch.batch_id).values_list("order_id", flat=True))
+        return batch, list(order_ids)
 
-            weighted = Order.objects.filter(order_id__in=orders).annotate(sum_weight=Window(expression=Sum('weight'),
-                                                                                            order_by=F("weight").asc()))
-            correct_ids = [i.order_id for i in weighted if i.sum_weight <= self.max_weight.get(courier.courier_type)]
+    @use_primary()
+    def dispatch_idle(self):
+        """
+        Распределяет все свободные заказы между курьерами без открытого развоза и записывает развозы
+        одной транзакцией. Курьеры, которые прямо сейчас получают заказы через assign_order, пропускаются
+        """
+        with transaction.atomic():
+            busy = Batch.objects.filter(is_complete=False).values("courier_id")
+            couriers = Courier.objects.select_for_update(skip_locked=True).exclude(courier_id__in=busy)
+            if settings.NORMALIZED_SCHEMA:
+                # only couriers that cover a region with free orders can get anything
+                free_regions = Order.objects.filter(batch_id__isnull=True).values("region")
+                couriers = couriers.filter(
+                    courier_id__in=CourierRegion.objects.filter(region__in=free_regions).values("courier_id"))
+            if settings.SHIFT_CALENDAR:
+                # only couriers on shift in a region with free orders within the lookahead
+                free_regions = Order.objects.filter(batch_id__isnull=True).values("region")
+                couriers = couriers.filter(shifts.available_soon(free_regions))
+            couriers = list(couriers.order_by("courier_id")
+                            .values_list("courier_id", "courier_type", "regions", "working_hours"))
+            if settings.SHIFT_CALENDAR:
+                hours = shifts.working_hours([courier[0] for courier in couriers])
+                couriers = [courier[:3] + (hours[courier[0]],) for courier in couriers]
+            if settings.ORDER_POOL:
+                with pool.lock:
+                    columns = pool.order_pool().columns()
+            else:
+                columns = normalized.order_columns(Order.objects.filter(batch_id__isnull=True))
+            plan = dispatch.solve(couriers, columns, self.max_weight)
 
-            good = Order.objects.filter(pk__in=correct_ids)
-            batch = Batch.objects.create(courier_id=courier.courier_id,
-                                         courier_type=courier.courier_type)
-            good.update(batch_id=batch.batch_id)
-            return good, batch.assign_time
+            courier_types = {courier[0]: courier[1] for courier in couriers}
+            claimed_plan = {}
+            for courier_id, order_ids in plan.items():
+                batch, claimed_ids = self.claim(courier_id, courier_types[courier_id], order_ids)
+                pool.track_claimed(order_ids)
+                # orders taken by a concurrent assign are not reported, a courier left with nothing gets no batch
+                if batch is not None:
+                    claimed_plan[courier_id] = claimed_ids
+                    notifications.publish(courier_id, "assigned", orders=claimed_ids, assign_time=batch.assign_time)
+        return claimed_plan
 
+    @use_primary()
     def complete_order(self, data):
         try:
             order = Order.objects.select_related().get(pk=data.get("order_id"),
                                                        batch__courier_id=data.get("courier_id"))
         except:
             return None
+        # only the first completion counts: a retried request neither records the delivery nor notifies again
+        if not Order.objects.filter(pk=order.order_id, complete_time__isnull=True) \
+                .update(complete_time=data.get("complete_time")):
+            order.refresh_from_db(fields=["complete_time"])
+            return order
         order.complete_time = data.get("complete_time")
-        order.save(update_fields=['complete_time'])
         if not Order.objects.filter(batch_id=order.batch.batch_id, complete_time__isnull=True):
             order.batch.is_complete = True
             order.batch.save(update_fields=['is_complete'])
+        # a completion without complete_time is accepted as before, but there is no duration to learn from
+        if order.complete_time is not None:
+            forecast.record_delivery(order)
+        notifications.publish(order.batch.courier_id, "completed", order_id=order.order_id,
+                              batch_complete=order.batch.is_complete)
         return order
 
 
 class CourierManager(models.Manager):
+    coefs = {'foot': 2,
+             'bike': 5,
+             'car': 9}
+
     def rating(self, courier_id):
+        return self.ratings([courier_id]).get(courier_id)
+
+    def ratings(self, courier_ids=None):
+        """
+        Рейтинги курьеров {courier_id: рейтинг} (по умолчанию всех); курьеров без выполненных развозов в ответе нет
+        """
+        return dict(self.iter_ratings(courier_ids))
+
+    # seconds between two timestamps: Postgres and SQLite (CI, local benchmarks) spell it differently
+    seconds_between = {
+        "postgresql": "extract(epoch from (finish::timestamp - start::timestamp))",
+        "sqlite": "(julianday(finish) - julianday(start)) * 86400",
+    }
+    max_query_ids = 10000
+
+    def iter_ratings(self, courier_ids=None, chunk_size=2000):
         """
-        Эффективный запрос на получение рейтинга, быстрее и проще, чем ORM от Django
+        Эффективный запрос на получение рейтинга, быстрее и проще, чем ORM от Django.
+        Все курьеры считаются одним проходом: окна разбиты по (курьер, регион), а результат читается
+        серверным курсором порциями по chunk_size, так что число курьеров не ограничено памятью;
+        не больше chunk_size курьеров читаются обычным курсором.
+        Доставки, перенесённые в архив, учитываются через суммы из CourierRegionSummary
         """
-        query = """SELECT MIN(region_avg) FROM
-                    (SELECT AVG(extract(epoch from (finish::timestamp - start::timestamp))) as region_avg FROM
-                    (SELECT region, complete_time as finish,
+        query = """SELECT courier_id, MIN(region_total / region_count) FROM
+                    (SELECT courier_id, region, SUM(seconds) as region_total, SUM(deliveries) as region_count FROM
+                    (SELECT courier_id, region, {seconds} as seconds, 1 as deliveries FROM
+                    (SELECT ab.courier_id, apis_order.region, complete_time as finish,
                            CASE
-                            WHEN row_number() OVER(PARTITION BY region ORDER BY complete_time ASC) = 1 THEN assign_time
-                            ELSE LAG(complete_time) OVER(PARTITION BY region ORDER BY complete_time ASC)
+                            WHEN row_number() OVER deliveries = 1
+                             THEN COALESCE(summary.last_complete_time, assign_time)
+                            ELSE LAG(complete_time) OVER deliveries
                             END
                             AS start
                     FROM apis_order LEFT JOIN apis_batch ab on apis_order.batch_id = ab.batch_id
-                    WHERE ab.is_complete = True AND courier_id = %s) as sub
-                    GROUP BY region) as mins;"""
-        with connection.cursor() as cursor:
-            cursor.execute(query, [courier_id])
-            t = cursor.fetchone()[0]
-        return (60 * 60 - min(t, 60 * 60)) / (60 * 60) * 5 if t else None
+                    LEFT JOIN apis_courierregionsummary summary
+                        on summary.courier_id = ab.courier_id AND summary.region = apis_order.region
+                    WHERE ab.is_complete = TRUE AND {couriers}
+                    WINDOW deliveries AS (PARTITION BY ab.courier_id, apis_order.region
+                                          ORDER BY complete_time ASC)) as sub
+                    UNION ALL
+                    SELECT courier_id, region, total_seconds, deliveries FROM apis_courierregionsummary
+                    WHERE {summary_couriers}) as parts
+                    GROUP BY courier_id, region) as mins
+                    GROUP BY courier_id;"""
+        connection = connections[router.db_for_read(Courier)]
+        if connection.vendor not in self.seconds_between:
+            raise NotSupportedError("rating is not implemented for %s" % connection.vendor)
+        seconds = self.seconds_between[connection.vendor]
+        if courier_ids is None:
+            query, params = query.format(seconds=seconds, couriers="TRUE", summary_couriers="TRUE"), []
+        elif connection.vendor == "postgresql":
+            courier_ids = list(courier_ids)
+            query = query.format(seconds=seconds, couriers="ab.courier_id = ANY(%s)",
+                                 summary_couriers="courier_id = ANY(%s)")
+            params = [courier_ids, courier_ids]
+        else:
+            courier_ids = list(courier_ids)
+            if len(courier_ids) > self.max_query_ids:
+                # SQLite limits the number of bound parameters
+                for start in range(0, len(courier_ids), self.max_query_ids):
+                    yield from self.iter_ratings(courier_ids[start:start + self.max_query_ids], chunk_size)
+                return
+            placeholders = ", ".join(["%s"] * len(courier_ids)) or "NULL"
+            query = query.format(seconds=seconds, couriers="ab.courier_id IN (%s)" % placeholders,
+                                 summary_couriers="courier_id IN (%s)" % placeholders)
+            params = courier_ids * 2
+        # a named server-side cursor costs extra round trips; a few couriers (GET /couriers/{id}) fit in one fetch
+        single_fetch = courier_ids is not None and len(courier_ids) <= chunk_size
+        with (connection.cursor() if single_fetch else connection.chunked_cursor()) as cursor:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for courier_id, t in rows:
+                    # extract(epoch ...) is numeric since Postgres 14
+                    if t:
+                        yield courier_id, self.score(float(t))
+
+    @staticmethod
+    def score(t):
+        """
+        Рейтинг по наименьшему среднему времени доставки t (в секундах) среди регионов
+        """
+        return (60 * 60 - min(t, 60 * 60)) / (60 * 60) * 5
 
     def earnings(self, courier_id):
-        coefs = {'foot': 2,
-                 'bike': 5,
-                 'car': 9}
+        return self.earnings_many([courier_id])[courier_id]
 
-        batches = Batch.objects.filter(courier_id=courier_id, is_complete=True)
-        return 500 * sum([coefs.get(key) for key in batches.values_list("courier_type", flat=True)])
+    def earnings_many(self, courier_ids):
+        """
+        Заработок курьеров {courier_id: сумма} по выполненным и архивным развозам
+        """
+        courier_ids = list(courier_ids)
+        earned = dict.fromkeys(courier_ids, 0)
+        batches = Batch.objects.filter(courier_id__in=courier_ids, is_complete=True) \
+            .values_list("courier_id", "courier_type").annotate(count=models.Count("batch_id"))
+        for courier_id, courier_type, count in batches:
+            earned[courier_id] += 500 * self.coefs.get(courier_type) * count
+        for courier_id, archived in CourierSummary.objects.filter(courier_id__in=courier_ids) \
+                .values_list("courier_id", "earnings"):
+            earned[courier_id] += archived
+        return earned
 
 
 class Courier(models.Model):
@@ -152,6 +324,11 @@ class Batch(models.Model):
     courier = models.ForeignKey(Courier, on_delete=models.CASCADE, blank=True, null=True)
     courier_type = models.CharField(max_length=4, choices=COURIER_TYPE_CHOICES, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["is_complete", "batch_id"], name="apis_batch_state_idx"),
+        ]
+
 
 class Order(models.Model):
     order_id = models.PositiveIntegerField(primary_key=True, blank=False)
@@ -162,6 +339,173 @@ class Order(models.Model):
     delivery_hours = ArrayField(base_field=models.CharField(max_length=15), blank=False)
     complete_time = models.DateTimeField(auto_now=False, blank=True, null=True)
     batch = models.ForeignKey(Batch, on_delete=models.PROTECT, blank=True, null=True)
+    # explicit priority from the client and the static key of the priority queue (apis.priority)
+    priority = models.PositiveSmallIntegerField(default=0)
+    created_time = models.DateTimeField(default=timezone.now)
+    priority_key = models.BigIntegerField(default=0)
 
     objects = models.Manager()
     order_manager = OrderManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["region", "order_id"], name="apis_order_region_idx"),
+            models.Index(fields=["region", "-priority_key", "order_id"], name="apis_order_priority_idx",
+                         condition=models.Q(batch__isnull=True)),
+            # GET /orders?complete=false; completed orders are the bulk of the table and are read by the primary key
+            models.Index(fields=["order_id"], name="apis_order_open_idx",
+                         condition=models.Q(complete_time__isnull=True)),
+        ]
+
+
+class CourierRegion(models.Model):
+    """
+    Регионы курьера отдельными строками (settings.NORMALIZED_SCHEMA): по ним работает индекс и join без массивов
+    """
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE, related_name="region_rows")
+    region = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["region", "courier"], name="apis_courier_region_idx"),
+        ]
+
+
+class OrderWindow(models.Model):
+    """
+    Окно доставки заказа в минутах от начала суток (settings.NORMALIZED_SCHEMA)
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="windows")
+    start = models.SmallIntegerField()
+    end = models.SmallIntegerField()
+
+
+class ShiftTemplate(models.Model):
+    """
+    Еженедельная смена курьера (settings.SHIFT_CALENDAR): день недели (0 - понедельник) и интервал в минутах
+    """
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE, related_name="shift_templates")
+    weekday = models.PositiveSmallIntegerField(validators=[MaxValueValidator(6)])
+    start = models.SmallIntegerField()
+    end = models.SmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(check=models.Q(weekday__lte=6), name="apis_shift_template_weekday"),
+            models.CheckConstraint(check=models.Q(start__gte=0, start__lt=models.F("end"), end__lte=24 * 60),
+                                   name="apis_shift_template_interval"),
+        ]
+
+
+class ShiftOverride(models.Model):
+    """
+    Смены курьера на конкретную дату вместо недельного шаблона; запись без интервала - выходной
+    """
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE, related_name="shift_overrides")
+    date = models.DateField()
+    start = models.SmallIntegerField(blank=True, null=True)
+    end = models.SmallIntegerField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["courier", "date"], name="apis_shift_override_idx"),
+        ]
+        constraints = [
+            # a day off has no bounds, a shift has both and fits into the day; the explicit IS NOT NULL keeps
+            # a single bound from passing the check as unknown
+            models.CheckConstraint(check=models.Q(start__isnull=True, end__isnull=True)
+                                   | models.Q(start__isnull=False, end__isnull=False, start__gte=0,
+                                              start__lt=models.F("end"), end__lte=24 * 60),
+                                   name="apis_shift_override_interval"),
+        ]
+
+
+class AvailabilityWindow(models.Model):
+    """
+    Конкретный интервал доступности курьера в одном из его регионов на ближайшие SHIFT_HORIZON_DAYS дней
+    """
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE, related_name="availability")
+    region = models.PositiveIntegerField()
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["region", "start"], name="apis_availability_region_idx"),
+            models.Index(fields=["courier", "start"], name="apis_availability_courier_idx"),
+        ]
+
+
+class RegionAdjacency(models.Model):
+    """
+    Соседние регионы; связь неориентированная, достаточно одной записи на пару
+    """
+    region = models.PositiveIntegerField()
+    neighbour = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [("region", "neighbour")]
+
+
+class RegionForecast(models.Model):
+    """
+    Скетч длительностей доставки в регионе за один час суток (см. forecast.DurationSketch)
+    """
+    region = models.PositiveIntegerField()
+    hour = models.PositiveSmallIntegerField(validators=[MaxValueValidator(23)])
+    sketch = models.BinaryField(default=bytes)
+    deliveries = models.PositiveIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = [("region", "hour")]
+
+
+class CourierSummary(models.Model):
+    """
+    Заработок курьера за развозы, перенесённые в архив
+    """
+    courier = models.OneToOneField(Courier, on_delete=models.CASCADE, primary_key=True)
+    earnings = models.PositiveIntegerField(default=0)
+
+
+class CourierRegionSummary(models.Model):
+    """
+    Суммарное время и число архивных доставок курьера в регионе, а также время последней из них -
+    от него отсчитывается первая доставка в регионе, оставшаяся в рабочих таблицах
+    """
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE)
+    region = models.PositiveIntegerField()
+    deliveries = models.PositiveIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+    last_complete_time = models.DateTimeField()
+
+    class Meta:
+        unique_together = [("courier", "region")]
+
+
+class ArchivedOrder(models.Model):
+    """
+    Выполненный заказ из архивированного развоза вместе с данными самого развоза
+    """
+    order_id = models.PositiveIntegerField(primary_key=True)
+    weight = models.DecimalField(max_digits=4, decimal_places=2)
+    region = models.PositiveIntegerField()
+    delivery_hours = ArrayField(base_field=models.CharField(max_length=15))
+    complete_time = models.DateTimeField()
+    batch_id = models.PositiveIntegerField(db_index=True)
+    assign_time = models.DateTimeField(null=True)
+    courier_id = models.PositiveIntegerField(db_index=True)
+    courier_type = models.CharField(max_length=4, null=True)
+    archived_time = models.DateTimeField(auto_now_add=True)
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ответ на запрос с заголовком Idempotency-Key; status_code пуст, пока первый запрос ещё выполняется
+    """
+    key_hash = models.CharField(max_length=64, unique=True)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_time = models.DateTimeField(auto_now_add=True, db_index=True)
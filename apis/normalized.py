@@ -0,0 +1,71 @@
+"""
+Нормализованная схема (settings.NORMALIZED_SCHEMA): регионы курьеров и окна доставки заказов в дочерних таблицах.
+
+Массивы в Courier и Order остаются источником данных для API, а CourierRegion и OrderWindow обновляются при
+сохранении моделей. Окна хранятся целыми минутами, поэтому колонки для ядра подбора читаются одним join без
+разбора строк "HH:MM-HH:MM", а курьеры ищутся по индексу (region, courier) на любом движке базы.
+Для уже существующих данных таблицы заполняет команда normalize_schema.
+"""
+import numpy as np
+from django.conf import settings
+from django.db.models.signals import post_save
+
+from . import matching, models
+
+
+def sync_courier_regions(couriers, created=False):
+    if not created:
+        models.CourierRegion.objects.filter(courier_id__in=[courier.courier_id for courier in couriers]).delete()
+    models.CourierRegion.objects.bulk_create([models.CourierRegion(courier_id=courier.courier_id, region=region)
+                                              for courier in couriers for region in courier.regions])
+
+
+def sync_order_windows(orders, created=False):
+    if not created:
+        models.OrderWindow.objects.filter(order_id__in=[order.order_id for order in orders]).delete()
+    hours = [(order.order_id, value) for order in orders for value in order.delivery_hours]
+    if not hours:
+        return
+    starts, ends = matching.parse_hours([value for _, value in hours])
+    models.OrderWindow.objects.bulk_create([models.OrderWindow(order_id=order_id, start=start, end=end)
+                                            for (order_id, _), start, end in zip(hours, starts.tolist(), ends.tolist())])
+
+
+def courier_saved(instance, created, update_fields=None, **kwargs):
+    if settings.NORMALIZED_SCHEMA and (update_fields is None or "regions" in update_fields):
+        sync_courier_regions([instance], created)
+
+
+def order_saved(instance, created, update_fields=None, **kwargs):
+    if settings.NORMALIZED_SCHEMA and (update_fields is None or "delivery_hours" in update_fields):
+        sync_order_windows([instance], created)
+
+
+def order_columns(queryset):
+    """
+    matching.OrderColumns для заказов из queryset; в нормализованной схеме окна берутся из OrderWindow
+    """
+    if not settings.NORMALIZED_SCHEMA:
+        return matching.OrderColumns.from_queryset(queryset)
+    rows = list(queryset.order_by("order_id")
+                .values_list("order_id", "region", "weight", "windows__start", "windows__end"))
+    if not rows:
+        return matching.OrderColumns.from_rows([])
+    ids, regions, weights, starts, ends = zip(*rows)
+    ids, first, owners = np.unique(np.array(ids, dtype=np.int64), return_index=True, return_inverse=True)
+    # an order without windows comes as a single row of NULLs from the LEFT JOIN
+    starts = np.array(starts, dtype=np.float64)
+    ends = np.array(ends, dtype=np.float64)
+    present = ~np.isnan(starts)
+    return matching.OrderColumns(
+        ids=ids,
+        regions=np.array(regions, dtype=np.int64)[first],
+        weights=np.rint(np.array(weights, dtype=np.float64)[first] * matching.WEIGHT_SCALE).astype(np.int64),
+        owners=owners[present],
+        starts=starts[present].astype(np.int64),
+        ends=ends[present].astype(np.int64),
+    )
+
+
+post_save.connect(courier_saved, sender="apis.Courier")
+post_save.connect(order_saved, sender="apis.Order")
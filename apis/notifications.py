@@ -0,0 +1,161 @@
+"""
+Публикация событий для курьеров: назначение развоза, снятие заказов после изменения курьера, выполнение заказа.
+
+События уходят в брокер из settings.NOTIFICATIONS_BROKER только после коммита транзакции. InProcessBroker живёт
+в памяти процесса и годится, только когда API и поток событий обслуживает один процесс. PostgresBroker передаёт
+события через LISTEN/NOTIFY: воркеры API (WSGI) публикуют, а ASGI-процесс потока событий слушает канал и раздаёт
+сообщения своим подписчикам.
+"""
+import functools
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils.module_loading import import_string
+
+CHANNEL = "apis_events"
+# NOTIFY payloads are limited to 8000 bytes
+MAX_PAYLOAD = 7999
+
+logger = logging.getLogger(__name__)
+
+# readiness of a broker that delivers from the moment of subscription
+READY = threading.Event()
+READY.set()
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel, callback):
+        """
+        Подписывает callback на канал; возвращает threading.Event, который установлен, когда события уже доходят
+        """
+        with self._lock:
+            self._subscribers[channel].add(callback)
+        return READY
+
+    def unsubscribe(self, channel, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(channel)
+            if callbacks is not None:
+                callbacks.discard(callback)
+                if not callbacks:
+                    del self._subscribers[channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            callback(message)
+
+    def subscribers(self):
+        with self._lock:
+            return sum(map(len, self._subscribers.values()))
+
+
+class Listener(threading.Thread):
+    """
+    Фоновый поток с отдельным соединением, который слушает канал и передаёт каждое уведомление в deliver.
+    Уведомления, пришедшие пока соединение было разорвано, теряются: клиенты потока событий переподключаются
+    и перечитывают состояние через API
+    """
+
+    def __init__(self, deliver, using=DEFAULT_DB_ALIAS):
+        super().__init__(name="notifications", daemon=True)
+        self.deliver = deliver
+        self.using = using
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+
+    def run(self):
+        import psycopg2
+
+        while not self.stopped.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(**connections[self.using].get_connection_params())
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute("LISTEN %s" % CHANNEL)
+                self.ready.set()
+                while not self.stopped.is_set():
+                    if select.select([connection], [], [], settings.CHANGEFEED_TIMEOUT) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self.deliver(connection.notifies.pop(0).payload)
+            except psycopg2.Error:
+                logger.exception("notifications connection lost")
+                self.ready.set()
+                self.stopped.wait(1)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Брокер для нескольких процессов поверх Postgres LISTEN/NOTIFY. Слушающий поток запускается при первой
+    подписке, поэтому процессы, которые только публикуют, лишнего соединения не держат
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, channel, callback):
+        # does not wait for LISTEN: the caller may be an event loop, it waits on the returned event its own way
+        super().subscribe(channel, callback)
+        with self._lock:
+            # after fork the thread of the parent process does not exist in the child
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = Listener(self.deliver)
+                self._listener.start()
+            return self._listener.ready
+
+    def publish(self, channel, message):
+        payload = json.dumps({"channel": channel, "message": message})
+        if len(payload.encode()) > MAX_PAYLOAD:
+            logger.warning("event for %s is too large for NOTIFY, dropped", channel)
+            return
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+
+    def deliver(self, payload):
+        event = json.loads(payload)
+        super().publish(event["channel"], event["message"])
+
+    def stop(self):
+        with self._lock:
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+
+
+@functools.lru_cache(maxsize=None)
+def broker():
+    return import_string(settings.NOTIFICATIONS_BROKER)()
+
+
+def courier_channel(courier_id):
+    return "courier:%s" % courier_id
+
+
+def publish(courier_id, event, **data):
+    """
+    Отправляет событие курьеру после успешного коммита текущей транзакции
+    """
+    message = json.dumps({"event": event, **data}, cls=DjangoJSONEncoder)
+    transaction.on_commit(lambda: broker().publish(courier_channel(courier_id), message))
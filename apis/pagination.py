@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная пагинация по первичному ключу: каждая страница - это WHERE pk > <курсор> LIMIT n,
+    поэтому глубокие страницы стоят столько же, сколько первая
+    """
+    ordering = "pk"
+    page_size = 100
+    page_size_query_param = "limit"
+    max_page_size = 1000
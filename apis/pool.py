@@ -0,0 +1,354 @@
+"""
+Компактный пул свободных заказов в памяти процесса.
+
+Экземпляр Order с Decimal-весом и списком строк delivery_hours занимает килобайты, поэтому пул хранит
+свободные заказы параллельными массивами NumPy: int32 id, int32 регион, uint16 вес в сотых долях и
+uint64-битмап получасовых слотов суток, покрытых окнами доставки. Точные окна лежат в плоских массивах
+минут (int16), на заказ приходится смещение первого окна и их число.
+
+id -> строка ищется в хеш-таблице с открытой адресацией (тоже массивы NumPy), поэтому удаление забранного
+заказа - это O(1): найти строку и снять флаг alive. Массивы растут удвоением, а когда мёртвых строк становится
+больше половины, пул уплотняется. На миллион заказов с двумя окнами уходит около 50 МБ.
+
+Пул ведётся отдельно в каждом процессе (settings.ORDER_POOL): он загружается из apis_order один раз, обновляется
+после фиксации транзакций этого процесса, а изменения других процессов получает через apis.changefeed.
+Все обращения к пулу выполняются под lock, потому что подписчик ленты меняет его из своего потока.
+"""
+import functools
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from . import changefeed, matching, models
+
+SLOT_MINUTES = 30
+EMPTY = -1
+
+lock = threading.RLock()
+
+
+def slot_bitmaps(starts, ends):
+    """
+    Битмапы слотов по SLOT_MINUTES, которые пересекают окна [start, end).
+    Если два окна пересекаются по минутам, у них есть общий слот, поэтому битмап - безопасный префильтр
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    # minutes past the 64th slot share the last bit, which keeps the prefilter safe for malformed hours
+    low = np.clip(starts // SLOT_MINUTES, 0, 63).astype(np.uint64)
+    high = np.clip((ends - 1) // SLOT_MINUTES, 0, 63).astype(np.uint64)
+    one = np.uint64(1)
+    up_to_high = (np.left_shift(one, high) - one) | np.left_shift(one, high)
+    bitmaps = up_to_high ^ (np.left_shift(one, low) - one)
+    return np.where(ends > starts, bitmaps, np.uint64(0))
+
+
+class IdIndex:
+    """
+    Хеш-таблица id -> номер строки с линейным пробированием. Удалённый id остаётся в таблице со значением EMPTY,
+    поэтому цепочки пробирования не рвутся, а возвращённый в пул заказ занимает свой прежний слот
+    """
+    __slots__ = ("keys", "values", "used")
+
+    def __init__(self, capacity=16):
+        self.keys = np.full(capacity, EMPTY, dtype=np.int32)
+        self.values = np.full(capacity, EMPTY, dtype=np.int32)
+        self.used = 0
+
+    def home(self, keys):
+        # Fibonacci hashing: the upper bits of key * 2^32 / phi
+        mixed = (np.asarray(keys, dtype=np.uint64) * np.uint64(2654435769)) & np.uint64(0xFFFFFFFF)
+        shift = np.uint64(32 - (len(self.keys).bit_length() - 1))
+        return (mixed >> shift).astype(np.int64)
+
+    def find(self, keys):
+        """
+        Номера слотов таблицы для keys: слот с этим ключом или первый пустой на пути пробирования
+        """
+        keys = np.asarray(keys, dtype=np.int32)
+        slots = self.home(keys)
+        pending = np.arange(len(keys))
+        mask = len(self.keys) - 1
+        while len(pending):
+            found = self.keys[slots[pending]]
+            pending = pending[(found != keys[pending]) & (found != EMPTY)]
+            slots[pending] = (slots[pending] + 1) & mask
+        return slots
+
+    def get(self, keys):
+        return self.values[self.find(keys)]
+
+    def put(self, keys, values):
+        """
+        Записывает пары ключ-значение; ключи в одном вызове не должны повторяться
+        """
+        keys = np.asarray(keys, dtype=np.int32)
+        values = np.asarray(values, dtype=np.int32)
+        if 2 * (self.used + len(keys)) > len(self.keys):
+            self.resize(2 * (self.used + len(keys)))
+        slots = self.find(keys)
+        new = self.keys[slots] == EMPTY
+        # two new keys can share a free slot, the loser moves on along its chain
+        while new.any():
+            unique_slots, first = np.unique(slots[new], return_index=True)
+            winners = np.flatnonzero(new)[first]
+            self.keys[unique_slots] = keys[winners]
+            self.used += len(winners)
+            slots[new] = self.find(keys[new])
+            new = self.keys[slots] == EMPTY
+        self.values[slots] = values
+
+    def remove(self, keys):
+        self.values[self.find(keys)] = EMPTY
+
+    def resize(self, minimum):
+        live = self.values != EMPTY
+        keys, values = self.keys[live], self.values[live]
+        capacity = 16
+        while capacity < minimum:
+            capacity *= 2
+        self.keys = np.full(capacity, EMPTY, dtype=np.int32)
+        self.values = np.full(capacity, EMPTY, dtype=np.int32)
+        self.used = 0
+        self.put(keys, values)
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.values.nbytes
+
+
+class OrderPool:
+    __slots__ = ("ids", "regions", "weights", "bitmaps", "alive", "first_window", "window_count",
+                 "starts", "ends", "size", "windows", "live", "index")
+
+    def __init__(self, capacity=16):
+        self.ids = np.zeros(capacity, dtype=np.int32)
+        self.regions = np.zeros(capacity, dtype=np.int32)
+        self.weights = np.zeros(capacity, dtype=np.uint16)
+        self.bitmaps = np.zeros(capacity, dtype=np.uint64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.first_window = np.zeros(capacity, dtype=np.int32)
+        self.window_count = np.zeros(capacity, dtype=np.uint16)
+        self.starts = np.zeros(capacity, dtype=np.int16)
+        self.ends = np.zeros(capacity, dtype=np.int16)
+        # rows and windows in use, live rows among them
+        self.size = self.windows = self.live = 0
+        self.index = IdIndex()
+
+    @classmethod
+    def load(cls, chunk_size=10000):
+        """
+        Загружает все свободные заказы из базы порциями
+        """
+        pool = cls()
+        rows = models.Order.objects.filter(batch_id__isnull=True) \
+            .values_list("order_id", "region", "weight", "delivery_hours").iterator(chunk_size=chunk_size)
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                pool.add(chunk)
+                chunk = []
+        pool.add(chunk)
+        return pool
+
+    def __len__(self):
+        return self.live
+
+    def __contains__(self, order_id):
+        return bool(self.index.get([order_id])[0] != EMPTY)
+
+    @property
+    def nbytes(self):
+        columns = (self.ids, self.regions, self.weights, self.bitmaps, self.alive,
+                   self.first_window, self.window_count, self.starts, self.ends)
+        return sum(column.nbytes for column in columns) + self.index.nbytes
+
+    def add(self, rows):
+        """
+        Добавляет заказы из кортежей (order_id, region, weight, delivery_hours); уже известные id заменяются
+        """
+        columns = matching.OrderColumns.from_rows(rows)
+        count = len(columns)
+        if not count:
+            return
+        self.discard(columns.ids)
+        lengths = np.bincount(columns.owners, minlength=count)
+        self.reserve(count, len(columns.starts))
+
+        rows = slice(self.size, self.size + count)
+        windows = slice(self.windows, self.windows + len(columns.starts))
+        self.ids[rows] = columns.ids
+        self.regions[rows] = columns.regions
+        self.weights[rows] = columns.weights
+        self.alive[rows] = True
+        self.first_window[rows] = self.windows + np.cumsum(lengths) - lengths
+        self.window_count[rows] = lengths
+        self.starts[windows] = columns.starts
+        self.ends[windows] = columns.ends
+        bitmaps = np.zeros(count, dtype=np.uint64)
+        np.bitwise_or.at(bitmaps, columns.owners, slot_bitmaps(columns.starts, columns.ends))
+        self.bitmaps[rows] = bitmaps
+
+        self.index.put(columns.ids, np.arange(rows.start, rows.stop))
+        self.size += count
+        self.windows += len(columns.starts)
+        self.live += count
+
+    def discard(self, order_ids):
+        """
+        Убирает заказы из пула (их забрал курьер); неизвестные id пропускаются
+        """
+        order_ids = np.asarray(order_ids, dtype=np.int32)
+        rows = self.index.get(order_ids)
+        rows = rows[rows != EMPTY]
+        self.alive[rows] = False
+        self.index.remove(self.ids[rows])
+        self.live -= len(rows)
+        if self.size > 1024 and self.live < self.size // 2:
+            self.compact()
+
+    def reserve(self, rows, windows):
+        capacity = len(self.ids)
+        while capacity < self.size + rows:
+            capacity *= 2
+        if capacity != len(self.ids):
+            for name in ("ids", "regions", "weights", "bitmaps", "alive", "first_window", "window_count"):
+                column = getattr(self, name)
+                grown = np.zeros(capacity, dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                setattr(self, name, grown)
+        capacity = len(self.starts)
+        while capacity < self.windows + windows:
+            capacity *= 2
+        if capacity != len(self.starts):
+            for name in ("starts", "ends"):
+                column = getattr(self, name)
+                grown = np.zeros(capacity, dtype=column.dtype)
+                grown[:self.windows] = column[:self.windows]
+                setattr(self, name, grown)
+
+    def compact(self):
+        """
+        Переписывает пул без мёртвых строк и их окон
+        """
+        rows = np.flatnonzero(self.alive[:self.size])
+        columns = self.columns(rows)
+        lengths = self.window_count[rows]
+        for name in ("ids", "regions", "weights", "bitmaps", "window_count"):
+            column = getattr(self, name)
+            column[:len(rows)] = column[rows]
+        self.alive[:len(rows)] = True
+        self.alive[len(rows):] = False
+        self.first_window[:len(rows)] = np.cumsum(lengths, dtype=np.int32) - lengths
+        self.starts[:len(columns.starts)] = columns.starts
+        self.ends[:len(columns.ends)] = columns.ends
+        self.size = self.live = len(rows)
+        self.windows = len(columns.starts)
+        self.index = IdIndex()
+        self.index.put(self.ids[:self.size], np.arange(self.size))
+
+    def columns(self, rows=None):
+        """
+        Колонки matching.OrderColumns для строк пула (по умолчанию всех живых) с их точными окнами
+        """
+        if rows is None:
+            rows = np.flatnonzero(self.alive[:self.size])
+        counts = self.window_count[rows].astype(np.int64)
+        owners = np.repeat(np.arange(len(rows)), counts)
+        # position of every window: first window of its row plus its rank inside the row
+        offsets = np.cumsum(counts) - counts
+        windows = self.first_window[rows].astype(np.int64)[owners] + np.arange(len(owners)) - offsets[owners]
+        return matching.OrderColumns(ids=self.ids[rows].astype(np.int64),
+                                     regions=self.regions[rows].astype(np.int64),
+                                     weights=self.weights[rows].astype(np.int64),
+                                     owners=owners,
+                                     starts=self.starts[windows].astype(np.int64),
+                                     ends=self.ends[windows].astype(np.int64))
+
+    def match(self, regions, working_hours, max_weight):
+        """
+        То же, что matching.match над всеми свободными заказами: регион и битмап слотов отсекают
+        кандидатов, а точная проверка окон и веса выполняется только для них
+        """
+        work_starts, work_ends = matching.parse_hours(working_hours)
+        work_bitmap = np.bitwise_or.reduce(slot_bitmaps(work_starts, work_ends))
+        mask = self.alive[:self.size] & np.isin(self.regions[:self.size], np.asarray(regions, dtype=np.int32))
+        mask &= (self.bitmaps[:self.size] & work_bitmap) != 0
+        return matching.match(self.columns(np.flatnonzero(mask)), regions, working_hours, max_weight)
+
+
+@functools.lru_cache(maxsize=None)
+def order_pool():
+    changefeed.listen()
+    return OrderPool.load()
+
+
+def loaded():
+    """
+    Пул включён и уже загружен в этом процессе. Незагруженный пул обновлять не нужно:
+    при первой загрузке он и так прочитает актуальное состояние
+    """
+    return settings.ORDER_POOL and order_pool.cache_info().currsize > 0
+
+
+def add_committed(rows):
+    with lock:
+        order_pool().add(rows)
+
+
+def discard_committed(order_ids):
+    with lock:
+        order_pool().discard(order_ids)
+
+
+def track_added(rows):
+    """
+    Добавляет заказы в пул после фиксации текущей транзакции и сообщает о них другим процессам
+    """
+    if not settings.ORDER_POOL:
+        return
+    rows = list(rows)
+    changefeed.notify("orders.added", (row[0] for row in rows))
+    if loaded():
+        transaction.on_commit(lambda: add_committed(rows))
+
+
+def track_claimed(order_ids):
+    """
+    Убирает заказы из пула после фиксации текущей транзакции и сообщает об этом другим процессам
+    """
+    if not settings.ORDER_POOL:
+        return
+    order_ids = list(order_ids)
+    changefeed.notify("orders.claimed", order_ids)
+    if loaded():
+        transaction.on_commit(lambda: discard_committed(order_ids))
+
+
+def apply_claimed(order_ids):
+    if loaded():
+        discard_committed(order_ids)
+
+
+def apply_added(order_ids):
+    """
+    Заказы, которые другой процесс добавил в пул. Строки читаются из базы: если заказ с тех пор
+    уже забрали, он не вернётся в пул
+    """
+    if loaded():
+        add_committed(models.Order.objects.filter(pk__in=order_ids, batch_id__isnull=True)
+                      .values_list("order_id", "region", "weight", "delivery_hours"))
+
+
+def reset_order_pool():
+    with lock:
+        order_pool.cache_clear()
+
+
+# claims go first: an order added and claimed within one batch is then filtered out by the database state
+changefeed.register("orders.claimed", apply_claimed)
+changefeed.register("orders.added", apply_added)
+changefeed.register_reset(reset_order_pool)
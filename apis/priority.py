@@ -0,0 +1,89 @@
+"""
+Приоритетная очередь заказов для режима settings.ASSIGN_PRIORITY.
+
+Оценка заказа линейна (в минутах): W_p * priority + W_a * возраст - W_d * время до конца последнего окна.
+Текущее время входит в возраст и в остаток окна одинаково для всех заказов, поэтому порядок по оценке
+совпадает с порядком по статическому ключу W_p * priority - W_a * created - W_d * deadline. Ключ считается
+при сохранении заказа и лежит в колонке priority_key с частичным индексом (region, -priority_key) по свободным
+заказам. Назначение читает этот индекс порциями сверху отдельно по каждому региону, сливает потоки через heapq
+и жадно набирает заказы под грузоподъёмность, так что просмотр k заказов стоит O(k log n), а не сортировки всех
+свободных заказов регионов.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import pre_save
+
+from . import matching, models
+
+CHUNK_SIZE = 100
+
+
+def priority_key(priority, created_time, delivery_hours):
+    weights = settings.ASSIGN_PRIORITY_WEIGHTS
+    _, ends = matching.parse_hours(delivery_hours)
+    deadline = int(ends.max()) if len(ends) else 0
+    created = int(created_time.timestamp() // 60)
+    return weights["priority"] * priority - weights["age"] * created - weights["deadline"] * deadline
+
+
+def order_saving(instance, update_fields=None, **kwargs):
+    if update_fields is None or {"priority", "delivery_hours"} & set(update_fields):
+        instance.priority_key = priority_key(instance.priority, instance.created_time, instance.delivery_hours)
+
+
+def region_rows(region, work_starts, work_ends, stats=None):
+    """
+    Свободные заказы региона порциями в порядке индекса: кортежи (-priority_key, order_id, вес в сотых, подходит по времени)
+    """
+    queryset = models.Order.objects.filter(region=region, batch_id__isnull=True).order_by("-priority_key", "order_id")
+    page = queryset
+    while True:
+        rows = list(page.values_list("order_id", "region", "weight", "delivery_hours", "priority_key")[:CHUNK_SIZE])
+        if stats is not None:
+            stats["chunks"] += 1
+            stats["rows"] += len(rows)
+        if not rows:
+            return
+        columns = matching.OrderColumns.from_rows(row[:4] for row in rows)
+        fits = matching.fits_by_time(columns, work_starts, work_ends).tolist()
+        for row, weight, fit in zip(rows, columns.weights.tolist(), fits):
+            yield -row[4], row[0], weight, fit
+        if len(rows) < CHUNK_SIZE:
+            return
+        key, order_id = rows[-1][4], rows[-1][0]
+        # keyset pagination; the range condition lets the index seek instead of rereading the region from the top
+        page = queryset.filter(priority_key__lte=key) \
+            .filter(Q(priority_key__lt=key) | Q(priority_key=key, order_id__gt=order_id))
+
+
+def new_stats():
+    return {"chunks": 0, "rows": 0, "scanned": 0, "time_rejected": [], "capacity_skipped": []}
+
+
+def select(regions, working_hours, max_weight, stats=None):
+    """
+    Заказы для курьера в порядке приоритета: подходящий по времени заказ берётся, если ещё помещается.
+    Просматривается не больше settings.ASSIGN_PRIORITY_SCAN заказов. В stats (см. new_stats) explain получает
+    число прочитанных порций и строк, просмотренных заказов и id отсеянных по времени и не поместившихся
+    """
+    capacity = max_weight * matching.WEIGHT_SCALE
+    work_starts, work_ends = matching.parse_hours(working_hours)
+    taken = []
+    # k-way merge of per-region index scans: an IN over several regions could not be read in key order
+    stream = heapq.merge(*(region_rows(region, work_starts, work_ends, stats) for region in sorted(set(regions))))
+    for scanned, (_, order_id, weight, fit) in enumerate(stream, 1):
+        if fit and weight <= capacity:
+            taken.append(order_id)
+            capacity -= weight
+        elif stats is not None:
+            stats["capacity_skipped" if fit else "time_rejected"].append(order_id)
+        if stats is not None:
+            stats["scanned"] = scanned
+        if capacity <= 0 or scanned >= settings.ASSIGN_PRIORITY_SCAN:
+            break
+    return taken
+
+
+pre_save.connect(order_saving, sender="apis.Order")
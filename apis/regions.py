@@ -0,0 +1,104 @@
+"""
+Граф соседства регионов для расширения поиска заказов.
+
+Рёбра хранятся в таблице RegionAdjacency, а в памяти процесса граф держится в CSR-виде: отсортированный
+массив регионов, indptr и indices. Соседи региона - это срез indices[indptr[i]:indptr[i + 1]], то есть O(степени)
+без запросов к базе. Граф загружается один раз и сбрасывается при изменении таблицы.
+"""
+import functools
+
+import numpy as np
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from . import changefeed, models
+
+
+class RegionGraph:
+    __slots__ = ("regions", "index", "indptr", "indices")
+
+    def __init__(self, regions, indptr, indices):
+        self.regions = regions
+        self.index = {region: position for position, region in enumerate(regions.tolist())}
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_edges(cls, edges):
+        """
+        Строит неориентированный граф из пар (region, neighbour)
+        """
+        pairs = np.array(list(edges), dtype=np.int64).reshape(-1, 2)
+        pairs = np.unique(np.concatenate([pairs, pairs[:, ::-1]]), axis=0)
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        regions = np.unique(pairs)
+        sources = np.searchsorted(regions, pairs[:, 0])
+        targets = np.searchsorted(regions, pairs[:, 1])
+        # np.unique already sorted the pairs by source, then by target
+        indptr = np.searchsorted(sources, np.arange(len(regions) + 1))
+        return cls(regions, indptr, targets)
+
+    def neighbours(self, region):
+        position = self.index.get(region)
+        if position is None:
+            return self.regions[:0]
+        return self.regions[self.indices[self.indptr[position]:self.indptr[position + 1]]]
+
+    def rings(self, regions, hops):
+        """
+        Возвращает регионы на расстоянии 1, 2, ..., hops от данных: по списку на каждый шаг
+        """
+        seen = set(regions)
+        frontier = list(seen)
+        result = []
+        for _ in range(hops):
+            ring = []
+            for region in frontier:
+                for neighbour in self.neighbours(region).tolist():
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        ring.append(neighbour)
+            if not ring:
+                break
+            result.append(ring)
+            frontier = ring
+        return result
+
+
+@functools.lru_cache(maxsize=None)
+def region_graph():
+    changefeed.listen()
+    return RegionGraph.from_edges(models.RegionAdjacency.objects.values_list("region", "neighbour"))
+
+
+def search_tiers(regions, hops=None):
+    """
+    Наборы регионов в порядке поиска заказов: сначала свои, затем соседние по числу шагов
+    (до settings.ASSIGN_NEIGHBOUR_HOPS, по умолчанию без расширения)
+    """
+    hops = settings.ASSIGN_NEIGHBOUR_HOPS if hops is None else hops
+    yield list(regions)
+    if hops:
+        yield from region_graph().rings(regions, hops)
+
+
+def reachable(regions, hops=None):
+    """
+    Все регионы, из которых курьер может получить заказы в текущем режиме поиска
+    """
+    return [region for tier in search_tiers(regions, hops) for region in tier]
+
+
+def reset_region_graph(*args):
+    region_graph.cache_clear()
+
+
+def adjacency_changed(**kwargs):
+    reset_region_graph()
+    changefeed.notify("regions")
+
+
+post_save.connect(adjacency_changed, sender="apis.RegionAdjacency")
+post_delete.connect(adjacency_changed, sender="apis.RegionAdjacency")
+changefeed.register("regions", reset_region_graph)
+changefeed.register_reset(reset_region_graph)
@@ -13,7 +13,8 @@ class CourierRouter(routers.SimpleRouter):
         ),
         routers.Route(
             url=r'^{prefix}$',
-            mapping={'post': 'create'},
+            mapping={'post': 'create',
+                     'get': 'list'},
             name='{basename}-detail',
             detail=True,
             initkwargs={'suffix': 'Detail'}
@@ -31,9 +32,33 @@ class OrdersRouter(routers.SimpleRouter):
         ),
         routers.Route(
             url=r'^{prefix}$',
-            mapping={'post': 'create'},
+            mapping={'post': 'create',
+                     'get': 'list'},
             name='{basename}-detail',
             detail=True,
             initkwargs={'suffix': 'Detail'}
         )
     ]
+
+
+class BatchRouter(routers.SimpleRouter):
+    routes = [
+        routers.Route(
+            url=r'^{prefix}$',
+            mapping={'get': 'list'},
+            name='{basename}-list',
+            detail=False,
+            initkwargs={'suffix': 'List'}
+        ),
+    ]
+
+
+class RegionRouter(routers.SimpleRouter):
+    routes = [
+        routers.DynamicRoute(
+            url=r'^{prefix}/{lookup}/{url_path}$',
+            name='{basename}-{url_name}',
+            detail=True,
+            initkwargs={}
+        ),
+    ]
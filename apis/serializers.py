@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from . import pool, shifts
 from .models import *
 from .models import Courier
 
@@ -27,19 +28,64 @@ class RunValidationMixin:
             #                                            e.detail))
 
 
+class SparseFieldsMixin:
+    """
+    Миксин для выдачи только запрошенных полей: ?fields=order_id,weight
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        requested = sparse_fields(request, self.fields.keys()) if request else None
+        if requested:
+            for name in set(self.fields.keys()) - set(requested):
+                self.fields.pop(name)
+
+
+def sparse_fields(request, available):
+    """
+    Возвращает список запрошенных в ?fields= полей из числа доступных
+    """
+    fields = request.query_params.get("fields")
+    if not fields:
+        return None
+    return [name for name in fields.split(",") if name in available]
+
+
+class CourierListSerializer(serializers.ListSerializer):
+    """
+    Считает рейтинги и заработок всей страницы курьеров двумя запросами вместо двух запросов на курьера
+    """
+
+    def to_representation(self, data):
+        couriers = list(data.all() if hasattr(data, "all") else data)
+        courier_ids = [courier.courier_id for courier in couriers]
+        self.child.prefetched_ratings = Courier.add_funcs.ratings(courier_ids)
+        self.child.prefetched_earnings = Courier.add_funcs.earnings_many(courier_ids)
+        return super().to_representation(couriers)
+
+
 class CourierSerializer(serializers.ModelSerializer):
     rating = serializers.SerializerMethodField()
     earnings = serializers.SerializerMethodField()
+    # filled by CourierListSerializer for many=True
+    prefetched_ratings = prefetched_earnings = None
 
     class Meta:
         model = Courier
         fields = '__all__'
+        list_serializer_class = CourierListSerializer
 
     def get_rating(self, obj):
-        rating = Courier.add_funcs.rating(obj.courier_id)
+        if self.prefetched_ratings is not None:
+            rating = self.prefetched_ratings.get(obj.courier_id)
+        else:
+            rating = Courier.add_funcs.rating(obj.courier_id)
         return round(rating, 2) if isinstance(rating, float) else None
 
     def get_earnings(self, obj):
+        if self.prefetched_earnings is not None:
+            return self.prefetched_earnings[obj.courier_id]
         return Courier.add_funcs.earnings(obj.courier_id)
 
     def to_representation(self, instance):
@@ -73,24 +119,37 @@ class CourierPostSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         couriers = validated_data['data']
-        for courier in couriers:
-            Courier.objects.create(**courier)
+        # a bulk import rebuilds the shift calendar once for all couriers
+        with shifts.deferred():
+            for courier in couriers:
+                Courier.objects.create(**courier)
         return validated_data
 
 
 class OrderSerializer(RunValidationMixin, serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = ("order_id", "weight", "region", "delivery_hours")
+        fields = ("order_id", "weight", "region", "delivery_hours", "priority")
 
 
 class OrderPostSerializer(serializers.Serializer):
     data = OrderSerializer(many=True)
 
+    def validate(self, data):
+        # archived orders keep their ids, so order ids stay unique across the working tables and the archive;
+        # the whole import is checked with one query
+        ids = [order["order_id"] for order in data["data"]]
+        archived = set(ArchivedOrder.objects.filter(pk__in=ids).values_list("pk", flat=True))
+        if archived:
+            raise ValidationError({"data": [{"id": order_id} if order_id in archived else {} for order_id in ids]})
+        return data
+
     def create(self, validated_data):
         orders = validated_data['data']
         for order in orders:
             Order.objects.create(**order)
+        pool.track_added((order["order_id"], order["region"], order["weight"], order["delivery_hours"])
+                         for order in orders)
         return validated_data
 
 
@@ -104,7 +163,13 @@ class OrderIdSerializer(serializers.ModelSerializer):
         return {"id": prev.get("order_id")}
 
 
-class BatchSerializer(serializers.ModelSerializer):
+class OrderListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ("order_id", "weight", "region", "delivery_hours", "priority", "batch", "complete_time")
+
+
+class BatchSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Batch
         fields = '__all__'
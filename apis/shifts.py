@@ -0,0 +1,177 @@
+"""
+Календарь смен курьеров (settings.SHIFT_CALENDAR).
+
+Смены задаются недельным шаблоном (ShiftTemplate) и заменами на конкретные даты (ShiftOverride); курьер без
+шаблона работает каждый день в свои working_hours. Из них материализуется таблица AvailabilityWindow - конкретные
+интервалы на SHIFT_HORIZON_DAYS дней вперёд, по строке на регион курьера, с индексом (region, start) для запросов
+"кто доступен в регионе R в момент T". Интервалы курьера пересобираются при изменении курьера, его шаблона или
+замен; сдвигать горизонт раз в сутки должна команда materialize_shifts. Курьер без интервалов и без смен
+(создан, пока календарь был выключен, и ещё не прошёл через materialize_shifts) работает по своим working_hours.
+"""
+import contextvars
+import datetime
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from . import matching, models
+
+# смена не длиннее суток, этим ограничивается просмотр индекса по start
+MAX_SHIFT = datetime.timedelta(days=1)
+MINUTES_PER_DAY = 24 * 60
+
+_deferred = contextvars.ContextVar("deferred_couriers", default=None)
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def daily_intervals(working_hours, templates, overrides, day):
+    """
+    Интервалы смен в минутах от начала дня: замена на дату, иначе шаблон, иначе working_hours
+    """
+    if day in overrides:
+        return overrides[day]
+    if templates:
+        return templates.get(day.weekday(), [])
+    starts, ends = matching.parse_hours(working_hours)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def materialize(couriers, first_day=None, days=None):
+    """
+    Пересобирает AvailabilityWindow курьеров с first_day (по умолчанию сегодня) на days дней вперёд
+    """
+    first_day = first_day or timezone.localdate()
+    days = days or settings.SHIFT_HORIZON_DAYS
+    last_day = first_day + datetime.timedelta(days=days)
+    courier_ids = [courier.courier_id for courier in couriers]
+
+    templates = defaultdict(lambda: defaultdict(list))
+    for courier_id, weekday, start, end in models.ShiftTemplate.objects.filter(courier_id__in=courier_ids) \
+            .values_list("courier_id", "weekday", "start", "end"):
+        templates[courier_id][weekday].append((start, end))
+    overrides = defaultdict(dict)
+    for courier_id, date, start, end in models.ShiftOverride.objects \
+            .filter(courier_id__in=courier_ids, date__gte=first_day, date__lt=last_day) \
+            .values_list("courier_id", "date", "start", "end"):
+        intervals = overrides[courier_id].setdefault(date, [])
+        if start is not None:
+            intervals.append((start, end))
+
+    windows = []
+    for courier in couriers:
+        for offset in range(days):
+            day = first_day + datetime.timedelta(days=offset)
+            midnight = day_start(day)
+            for start, end in daily_intervals(courier.working_hours, templates.get(courier.courier_id),
+                                              overrides[courier.courier_id], day):
+                windows.extend(models.AvailabilityWindow(courier_id=courier.courier_id, region=region,
+                                                         start=midnight + datetime.timedelta(minutes=start),
+                                                         end=midnight + datetime.timedelta(minutes=end))
+                               for region in courier.regions)
+    with transaction.atomic():
+        models.AvailabilityWindow.objects.filter(courier_id__in=courier_ids, start__gte=day_start(first_day)).delete()
+        models.AvailabilityWindow.objects.bulk_create(windows)
+    return len(windows)
+
+
+def available(regions, start, end):
+    """
+    Курьеры (queryset из courier_id), доступные в каком-либо из регионов хотя бы часть интервала [start, end)
+    """
+    return models.AvailabilityWindow.objects.filter(region__in=regions, start__lt=end, start__gt=start - MAX_SHIFT,
+                                                    end__gt=start).values("courier_id")
+
+
+def not_materialized():
+    """
+    Условие на Courier: у курьера нет ни интервалов, ни шаблона, ни замен
+    """
+    return ~Q(courier_id__in=models.AvailabilityWindow.objects.values("courier_id")) \
+        & ~Q(courier_id__in=models.ShiftTemplate.objects.values("courier_id")) \
+        & ~Q(courier_id__in=models.ShiftOverride.objects.values("courier_id"))
+
+
+def available_soon(regions):
+    """
+    Условие на Courier: доступен в регионах в ближайшие SHIFT_LOOKAHEAD_MINUTES или ещё не материализован
+    """
+    now = timezone.now()
+    soon = available(regions, now, now + datetime.timedelta(minutes=settings.SHIFT_LOOKAHEAD_MINUTES))
+    return Q(courier_id__in=soon) | not_materialized()
+
+
+def working_hours(courier_ids, day=None):
+    """
+    Часы курьеров на день (по умолчанию сегодня) из AvailabilityWindow в формате working_hours;
+    для не материализованных курьеров - их working_hours
+    """
+    midnight = day_start(day or timezone.localdate())
+    hours = {courier_id: [] for courier_id in courier_ids}
+    windows = models.AvailabilityWindow.objects \
+        .filter(courier_id__in=courier_ids, start__gte=midnight, start__lt=midnight + MAX_SHIFT) \
+        .order_by("courier_id", "start", "end").values_list("courier_id", "start", "end").distinct()
+    for courier_id, start, end in windows:
+        start, end = ((moment - midnight) // datetime.timedelta(minutes=1) for moment in (start, end))
+        end = min(end, MINUTES_PER_DAY)
+        hours[courier_id].append("%02d:%02d-%02d:%02d" % (start // 60, start % 60, end // 60, end % 60))
+    idle = [courier_id for courier_id, intervals in hours.items() if not intervals]
+    if idle:
+        # an empty day is a day off only for couriers the calendar knows about
+        hours.update(models.Courier.objects.filter(not_materialized(), courier_id__in=idle)
+                     .values_list("courier_id", "working_hours"))
+    return hours
+
+
+def courier_hours(courier):
+    if not settings.SHIFT_CALENDAR:
+        return courier.working_hours
+    return working_hours([courier.courier_id])[courier.courier_id]
+
+
+@contextmanager
+def deferred():
+    """
+    Курьеры, сохранённые внутри блока, материализуются одним вызовом materialize при выходе из него
+    """
+    couriers = {}
+    token = _deferred.set(couriers)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    if couriers:
+        materialize(list(couriers.values()))
+
+
+def courier_saved(instance, created, update_fields=None, **kwargs):
+    if settings.SHIFT_CALENDAR and (update_fields is None or {"regions", "working_hours"} & set(update_fields)):
+        couriers = _deferred.get()
+        if couriers is None:
+            materialize([instance])
+        else:
+            couriers[instance.courier_id] = instance
+
+
+def shift_saved(instance, **kwargs):
+    if settings.SHIFT_CALENDAR:
+        materialize([instance.courier])
+
+
+def shift_deleted(instance, **kwargs):
+    # shifts are also deleted in cascade with their courier, so rebuild only if the courier is still there
+    if settings.SHIFT_CALENDAR:
+        transaction.on_commit(lambda: materialize(list(models.Courier.objects.filter(pk=instance.courier_id))))
+
+
+post_save.connect(courier_saved, sender="apis.Courier")
+for model in ("apis.ShiftTemplate", "apis.ShiftOverride"):
+    post_save.connect(shift_saved, sender=model)
+    post_delete.connect(shift_deleted, sender=model)
@@ -0,0 +1,114 @@
+"""
+Замеры холодного старта воркера и прогрев индексов подбора.
+
+probe() выполняется в отдельном процессе командой profile_startup, поэтому на верхнем уровне модуля
+импортируется только стандартная библиотека - иначе импорты попали бы в замер.
+"""
+import importlib
+import json
+import os
+import sys
+import time
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def timed_import_module(times):
+    """
+    Обёртка над importlib.import_module, запоминающая время импорта каждого модуля.
+    Django импортирует приложения и их models через importlib, а такие импорты -X importtime не показывает
+    """
+    def import_module(name, package=None):
+        started = time.perf_counter()
+        try:
+            return importlib.import_module(name, package)
+        finally:
+            times.setdefault(name, elapsed_ms(started))
+    return import_module
+
+
+def probe():
+    """
+    Поднимает Django с текущим DJANGO_SETTINGS_MODULE и печатает JSON с таймингами этапов старта
+    """
+    started = time.perf_counter()
+    import django
+    import django.apps.config
+    from django.conf import settings
+
+    imports = {}
+    django.apps.config.import_module = timed_import_module(imports)
+    django.setup()
+    django.apps.config.import_module = importlib.import_module
+    result = {"setup_ms": elapsed_ms(started), "apps_ms": {}}
+    from django.apps import apps
+    for config in apps.get_app_configs():
+        modules = (config.name, config.name + ".models")
+        result["apps_ms"][config.name] = {name: imports[name] for name in modules if name in imports}
+
+    result["middleware_ms"] = {}
+    from django.utils.module_loading import import_string
+    for path in settings.MIDDLEWARE:
+        step = time.perf_counter()
+        import_string(path)(lambda request: None)
+        result["middleware_ms"][path] = elapsed_ms(step)
+
+    step = time.perf_counter()
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+    result["urlconf_ms"] = elapsed_ms(step)
+
+    step = time.perf_counter()
+    preload()
+    result["preload_ms"] = elapsed_ms(step)
+
+    from django.db import transaction
+    from django.test import Client
+    request = json.loads(os.environ["PROFILE_REQUEST"])
+    client = Client()
+    for attempt in ("first_request", "second_request"):
+        step = time.perf_counter()
+        # the request runs in a rolled back transaction so profiling /orders/assign does not open batches
+        with transaction.atomic():
+            response = client.generic(request["method"], request["path"], json.dumps(request["data"]),
+                                      content_type="application/json")
+            transaction.set_rollback(True)
+        result[attempt + "_ms"] = elapsed_ms(step)
+        result[attempt + "_status"] = response.status_code
+    result["total_ms"] = elapsed_ms(started)
+    sys.stdout.write(json.dumps(result))
+
+
+def heaviest_imports(report, limit=10):
+    """
+    Разбирает вывод python -X importtime и возвращает самые долгие импорты верхнего уровня: [(модуль, мс)]
+    """
+    times = []
+    for line in report.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit() or fields[2].startswith("  "):
+            continue
+        times.append((fields[2].strip(), round(int(fields[1]) / 1000, 2)))
+    return sorted(times, key=lambda item: -item[1])[:limit]
+
+
+def preload():
+    """
+    Загружает в память процесса всё, что иначе строилось бы на первом запросе: граф регионов
+    и код ядра подбора, а при settings.ORDER_POOL - пул свободных заказов. Вызывается из gunicorn post_fork
+    """
+    from django.conf import settings
+
+    from apis import matching
+    from apis.pool import order_pool
+    from apis.regions import region_graph
+
+    region_graph()
+    if settings.ORDER_POOL:
+        order_pool()
+    columns = matching.OrderColumns.from_rows([(1, 1, 1, ["09:00-10:00"])])
+    matching.match(columns, [1], ["09:00-10:00"], 10)
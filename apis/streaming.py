@@ -0,0 +1,91 @@
+"""
+Server-Sent Events для курьеров: GET /couriers/{id}/events.
+
+Поток обслуживается напрямую ASGI-приложением (uvicorn, сервис events в docker-compose) без потока на соединение:
+каждое соединение - это корутина и небольшая asyncio.Queue, поэтому один процесс держит десятки тысяч простаивающих
+подключений (замер - manage.py bench_events). События от воркеров API приходят через notifications.PostgresBroker.
+"""
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Courier
+from .notifications import broker, courier_channel
+
+EVENTS_PATH = re.compile(r"^/couriers/(?P<courier_id>\d+)/events$")
+
+
+def courier_exists(courier_id):
+    return Courier.objects.filter(pk=courier_id).exists()
+
+
+async def wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def event_body(message):
+    return ("event: %s\ndata: %s\n\n" % (json.loads(message)["event"], message)).encode()
+
+
+async def courier_events(scope, receive, send, courier_id):
+    if not await sync_to_async(courier_exists)(courier_id):
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=settings.SSE_QUEUE_SIZE)
+
+    def put(message):
+        # a client that does not read its events loses the newest ones instead of growing the queue
+        if not queue.full():
+            queue.put_nowait(message)
+
+    def deliver(message):
+        loop.call_soon_threadsafe(put, message)
+
+    channel = courier_channel(courier_id)
+    ready = broker().subscribe(channel, deliver)
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        if not ready.is_set():
+            # the first subscriber of the process waits for LISTEN off the event loop
+            await loop.run_in_executor(None, ready.wait)
+        await send({"type": "http.response.start",
+                    "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream"),
+                                (b"cache-control", b"no-cache")]})
+        await send({"type": "http.response.body", "body": b": connected\n\n", "more_body": True})
+        while True:
+            message = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({message, disconnect}, timeout=settings.SSE_HEARTBEAT,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if message not in done:
+                message.cancel()
+            if disconnect in done:
+                break
+            body = event_body(message.result()) if message in done else b": keepalive\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        broker().unsubscribe(channel, deliver)
+        disconnect.cancel()
+
+
+class EventStreamRouter:
+    """
+    Отдаёт GET /couriers/{id}/events потоку событий, остальные запросы - приложению Django
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET":
+            match = EVENTS_PATH.match(scope["path"])
+            if match:
+                return await courier_events(scope, receive, send, int(match.group("courier_id")))
+        return await self.application(scope, receive, send)
@@ -0,0 +1,13 @@
+from apis.admission import assign_controller
+
+
+class AdmissionResetMixin:
+    """
+    Контроллер допуска /orders/assign живёт весь процесс, и его вёдра токенов переходили бы из теста в тест:
+    каждый тест начинает с нового контроллера, собранного из текущих настроек
+    """
+
+    def setUp(self):
+        super().setUp()
+        assign_controller.cache_clear()
+        self.addCleanup(assign_controller.cache_clear)
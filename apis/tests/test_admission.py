@@ -0,0 +1,109 @@
+import json
+import threading
+
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from apis.admission import AdmissionController, assign_controller
+from apis.models import IdempotencyKey
+from apis.tests.mixins import AdmissionResetMixin
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    def test_tokenBucket(self):
+        controller = AdmissionController(max_concurrency=1, queue_budget=0, rate=0.5, burst=2)
+
+        self.assertEqual(controller.take_token("1"), 0)
+        self.assertEqual(controller.take_token("1"), 0)
+        self.assertGreater(controller.take_token("1"), 1)
+        self.assertEqual(controller.take_token("2"), 0)
+        self.assertEqual(controller.metrics()["shed_rate_limited"], 1)
+
+    def test_shedWhenSlotsBusy(self):
+        controller = AdmissionController(max_concurrency=1, queue_budget=0.01, rate=1, burst=1)
+
+        self.assertTrue(controller.acquire())
+        waiter = threading.Thread(target=controller.acquire)
+        waiter.start()
+        waiter.join()
+
+        metrics = controller.metrics()
+        self.assertEqual(metrics["in_flight"], 1)
+        self.assertEqual(metrics["queue_depth"], 0)
+        self.assertEqual(metrics["shed_overload"], 1)
+
+        controller.release()
+        self.assertTrue(controller.acquire())
+
+    def test_bucketsAreBounded(self):
+        controller = AdmissionController(max_concurrency=1, queue_budget=0, rate=1, burst=1, max_buckets=2)
+
+        for key in "abc":
+            controller.take_token(key)
+
+        self.assertEqual(list(controller._buckets), ["b", "c"])
+
+
+@override_settings(ASSIGN_RATE=0.1, ASSIGN_BURST=1)
+class AssignAdmissionTests(AdmissionResetMixin, TestCase):
+    fixtures = ["assign_data.json"]
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+
+    def assign(self, **headers):
+        return self.client.post(path='/orders/assign', data={"courier_id": 1}, content_type="application/json",
+                                **headers)
+
+    def test_rateLimited(self):
+        self.assertEqual(self.assign().status_code, 200)
+
+        response = self.assign()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "10")
+
+    def test_replayIsNotThrottled(self):
+        first = self.assign(HTTP_IDEMPOTENCY_KEY="assign-1")
+
+        replayed = self.assign(HTTP_IDEMPOTENCY_KEY="assign-1")
+
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(json.loads(replayed.content), json.loads(first.content))
+        self.assertEqual(assign_controller().metrics()["shed_rate_limited"], 0)
+
+    def test_throttledKeyStaysFree(self):
+        self.assign()
+
+        self.assertEqual(self.assign(HTTP_IDEMPOTENCY_KEY="assign-2").status_code, 429)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(ASSIGN_MAX_CONCURRENCY=1, ASSIGN_QUEUE_BUDGET=0.01)
+    def test_shedRequestOnlyReadsKey(self):
+        assign_controller().acquire()
+
+        # the replay lookup, nothing is reserved or deleted
+        with self.assertNumQueries(1):
+            response = self.assign(HTTP_IDEMPOTENCY_KEY="assign-3")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(ASSIGN_MAX_CONCURRENCY=1, ASSIGN_QUEUE_BUDGET=0.01)
+    def test_overloadShed(self):
+        assign_controller().acquire()
+
+        response = self.assign()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+
+    def test_metrics(self):
+        self.assign()
+        self.assign()
+
+        metrics = json.loads(self.client.get(path='/metrics/admission').content)
+
+        self.assertEqual(metrics["admitted"], 1)
+        self.assertEqual(metrics["shed_rate_limited"], 1)
+        self.assertEqual(metrics["in_flight"], 0)
@@ -3,8 +3,10 @@ import json
 
 from django.test import Client, TestCase
 
+from apis.tests.mixins import AdmissionResetMixin
 
-class ApiInputTests(TestCase):
+
+class ApiInputTests(AdmissionResetMixin, TestCase):
     def test_setUp(self):
         self.client = Client()
 
@@ -316,7 +318,7 @@ class ApiInputTests(TestCase):
         self.assertEqual(response.status_code, 400)
 
 
-class CheckAfterAssignTests(TestCase):
+class CheckAfterAssignTests(AdmissionResetMixin, TestCase):
     fixtures = ["assign_data.json"]
 
     def test_setUp(self):
@@ -361,7 +363,7 @@ class CheckAfterAssignTests(TestCase):
         self.assertEqual(json.loads(response_assign.content)["orders"], correct_response_assign["orders"])
 
 
-class CalculationTests(TestCase):
+class CalculationTests(AdmissionResetMixin, TestCase):
     fixtures = ["courier_get_test_data.json"]
 
     def test_setUp(self):
@@ -0,0 +1,59 @@
+import datetime
+
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apis.archive import archive_chunk
+from apis.models import ArchivedOrder, Batch, Courier, Order
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        Courier.objects.create(courier_id=1, courier_type="foot", regions=[1, 2], working_hours=["08:00-12:00"])
+        start = timezone.now() - datetime.timedelta(days=10)
+        for number, (region, minutes) in enumerate([(1, [10, 25]), (2, [12]), (1, [7, 40])]):
+            assign_time = start + datetime.timedelta(days=number * 4)
+            batch = Batch.objects.create(courier_id=1, courier_type="foot", is_complete=True)
+            Batch.objects.filter(pk=batch.pk).update(assign_time=assign_time)
+            for minute in minutes:
+                Order.objects.create(order_id=number * 10 + minute, weight=1, region=region,
+                                     delivery_hours=["08:00-12:00"], batch=batch,
+                                     complete_time=assign_time + datetime.timedelta(minutes=minute))
+
+    def test_ratingAndEarningsKept(self):
+        # SQLite measures durations through julianday, which is only exact to ~1e-4 s
+        places = 5 if connection.vendor == "sqlite" else 7
+        rating = Courier.add_funcs.rating(1)
+        earnings = Courier.add_funcs.earnings(1)
+
+        archived = archive_chunk(timezone.now() - datetime.timedelta(days=3), chunk_size=1)
+        self.assertEqual(archived, 1)
+        self.assertAlmostEqual(Courier.add_funcs.rating(1), rating, places)
+        self.assertEqual(Courier.add_funcs.earnings(1), earnings)
+
+        archive_chunk(timezone.now() - datetime.timedelta(days=3), chunk_size=10)
+        self.assertEqual(Batch.objects.count(), 1)
+        self.assertEqual(ArchivedOrder.objects.count(), 3)
+        self.assertAlmostEqual(Courier.add_funcs.rating(1), rating, places)
+        self.assertEqual(Courier.add_funcs.earnings(1), earnings)
+
+    def test_nothingToArchive(self):
+        self.assertEqual(archive_chunk(timezone.now() - datetime.timedelta(days=30), chunk_size=10), 0)
+        self.assertEqual(Order.objects.count(), 5)
+
+    def test_archivedIdsAreNotReused(self):
+        archive_chunk(timezone.now() - datetime.timedelta(days=3), chunk_size=10)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().post(path='/orders', content_type="application/json", data={"data": [
+                {"order_id": 10, "weight": 1, "region": 1, "delivery_hours": ["10:00-11:00"]},
+                {"order_id": 99, "weight": 1, "region": 1, "delivery_hours": ["10:00-11:00"]},
+                {"order_id": 25, "weight": 1, "region": 1, "delivery_hours": ["10:00-11:00"]},
+            ]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"validation_error": {"orders": [{"id": 10}, {"id": 25}]}})
+        # one lookup for the whole import
+        self.assertEqual(sum("apis_archivedorder" in query["sql"] for query in queries), 1)
@@ -0,0 +1,114 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from apis import changefeed
+from apis.pool import order_pool
+
+WRITER = """
+from django.test import Client
+client = Client()
+client.post("/couriers", {"data": [{"courier_id": %(base)d, "courier_type": "foot", "regions": [1],
+                                   "working_hours": ["09:00-12:00"]}]}, content_type="application/json")
+client.post("/orders", {"data": [
+    {"order_id": %(base)d, "weight": 1, "region": 1, "delivery_hours": ["10:00-11:00"]},
+    {"order_id": %(base)d + 1, "weight": 1, "region": 2, "delivery_hours": ["10:00-11:00"]},
+]}, content_type="application/json")
+client.post("/orders/assign", {"courier_id": %(base)d}, content_type="application/json")
+"""
+
+
+def event(sender, seq, kind, ids=()):
+    return {"sender": sender, "seq": seq, "kind": kind, "ids": list(ids)}
+
+
+class SubscriberApplyTests(SimpleTestCase):
+    def setUp(self):
+        self.calls = []
+        patcher = mock.patch.multiple(changefeed, handlers={
+            "orders.claimed": lambda ids: self.calls.append(("claimed", sorted(ids))),
+            "orders.added": lambda ids: self.calls.append(("added", sorted(ids))),
+        }, resets=[lambda: self.calls.append("reset")])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.subscriber = changefeed.Subscriber()
+
+    def test_batchIsMergedByKind(self):
+        self.subscriber.apply([event("a:1:1", 1, "orders.added", [1, 2]),
+                               event("b:1:1", 7, "orders.claimed", [1]),
+                               event("a:1:1", 2, "orders.added", [3])])
+        self.assertEqual(self.calls, [("claimed", [1]), ("added", [1, 2, 3])])
+
+    def test_gapReloads(self):
+        self.subscriber.apply([event("a:1:1", 1, "orders.added", [1])])
+        with self.assertLogs("apis.changefeed", "WARNING"):
+            self.subscriber.apply([event("a:1:1", 3, "orders.added", [2])])
+        self.assertEqual(self.calls, [("added", [1]), "reset"])
+
+    def test_ownAndRepeatedEventsSkipped(self):
+        own = changefeed.sender_id()
+        self.subscriber.apply([event(own, 5, "orders.added", [1]),
+                               event("a:1:1", 1, "orders.claimed", [2]),
+                               event("a:1:1", 1, "orders.claimed", [3])])
+        self.assertEqual(self.calls, [("claimed", [2])])
+
+
+class SenderIdTests(SimpleTestCase):
+    def test_recycledThreadsAndProcessesAreNewSenders(self):
+        senders = []
+        for _ in range(2):
+            # the second thread usually gets the ident of the first one
+            thread = threading.Thread(target=lambda: senders.append(changefeed.sender_id()))
+            thread.start()
+            thread.join()
+        self.assertNotEqual(senders[0], senders[1])
+
+        own = changefeed.sender_id()
+        self.assertEqual(changefeed.sender_id(), own)
+        with mock.patch.object(changefeed, "_boot", changefeed._boot):
+            changefeed.forked()
+            self.assertNotEqual(changefeed.sender_id(), own)
+            self.assertEqual(changefeed.sender_id().rsplit(":", 1)[0], changefeed.process_id())
+
+
+@skipUnless(connection.vendor == "postgresql", "LISTEN/NOTIFY needs Postgres")
+@override_settings(CHANGEFEED=True, ORDER_POOL=True)
+class CrossProcessTests(TransactionTestCase):
+    available_apps = ["apis"]
+
+    def setUp(self):
+        order_pool.cache_clear()
+
+    def tearDown(self):
+        changefeed.stop()
+        order_pool.cache_clear()
+
+    def run_writers(self, *bases):
+        env = dict(os.environ, SQL_DATABASE=connection.settings_dict["NAME"], CHANGEFEED="1", ORDER_POOL="1")
+        writers = [subprocess.Popen([sys.executable, "manage.py", "shell", "-c", WRITER % {"base": base}],
+                                    cwd=settings.BASE_DIR, env=env) for base in bases]
+        for writer in writers:
+            self.assertEqual(writer.wait(timeout=60), 0)
+
+    def assertPoolBecomes(self, expected):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if sorted(order_pool().ids[order_pool().alive].tolist()) == expected:
+                return
+            time.sleep(0.05)
+        self.assertEqual(sorted(order_pool().ids[order_pool().alive].tolist()), expected)
+
+    def test_writesOfOtherProcessesReachPool(self):
+        self.assertEqual(len(order_pool()), 0)
+
+        self.run_writers(100, 200)
+
+        # every writer created two orders and its courier claimed the one in region 1
+        self.assertPoolBecomes([101, 201])
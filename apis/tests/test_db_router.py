@@ -0,0 +1,69 @@
+import datetime
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from apis import db_router
+from apis.models import Courier
+
+SHARED_CACHE = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "apis_cache"}}
+
+
+@override_settings(CACHES=SHARED_CACHE)
+@mock.patch("apis.db_router.replicas", return_value=["replica_0"])
+class ReplicaRouterTests(SimpleTestCase):
+    def test_readsGoToReplica(self, replicas):
+        self.assertEqual(db_router.ReplicaRouter().db_for_read(Courier), "replica_0")
+
+    def test_writesGoToPrimary(self, replicas):
+        self.assertEqual(db_router.ReplicaRouter().db_for_write(Courier), "default")
+
+    def test_usePrimary(self, replicas):
+        with db_router.use_primary():
+            self.assertEqual(db_router.ReplicaRouter().db_for_read(Courier), "default")
+        self.assertEqual(db_router.ReplicaRouter().db_for_read(Courier), "replica_0")
+
+    def test_pinCacheReadsPrimary(self, replicas):
+        self.assertEqual(db_router.ReplicaRouter().db_for_read(caches["default"].cache_model_class), "default")
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_perProcessCacheIsRefused(self, replicas):
+        with self.assertRaises(ImproperlyConfigured):
+            db_router.ReplicaRouter()
+
+
+class ReadYourWritesTests(TestCase):
+    fixtures = ["courier_get_test_data.json"]
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_completePinsCourier(self):
+        self.assertFalse(db_router.is_pinned(1))
+
+        self.client.post(path='/orders/complete', content_type="application/json", data={
+            "courier_id": 1,
+            "order_id": 5,
+            "complete_time": datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-4] + "Z"
+        })
+
+        self.assertTrue(db_router.is_pinned(1))
+
+    def test_pinnedRetrieveReadsPrimary(self):
+        db_router.pin_courier(2)
+        pinned = []
+
+        def spy(router, model, **hints):
+            # only the routing decision is recorded, the query itself runs against the test database
+            pinned.append(db_router._pinned.get())
+            return "default"
+
+        with mock.patch.object(db_router.ReplicaRouter, "db_for_read", spy):
+            response = self.client.get(path='/couriers/2')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(pinned)
+        self.assertTrue(all(pinned))
@@ -0,0 +1,96 @@
+import json
+from unittest import mock
+
+import numpy as np
+from django.test import Client, SimpleTestCase, TestCase
+
+from apis import dispatch, matching
+from apis.models import Batch, Order, OrderManager
+from apis.tests.mixins import AdmissionResetMixin
+
+
+class SolverTests(SimpleTestCase):
+    def test_scarceOrdersFirst(self):
+        """
+        Первый пришедший курьер забрал бы заказ 1 и оставил второго курьера без работы
+        """
+        couriers = [(1, "foot", [1, 2], ["09:00-12:00"]),
+                    (2, "foot", [1], ["09:00-12:00"])]
+        columns = matching.OrderColumns.from_rows([(1, 1, 5, ["10:00-11:00"]),
+                                                   (2, 2, 6, ["10:00-11:00"])])
+
+        plan = dispatch.solve(couriers, columns, OrderManager.max_weight)
+
+        self.assertEqual(plan, {1: [2], 2: [1]})
+
+    def test_capacity(self):
+        couriers = [(1, "foot", [1], ["09:00-12:00"])]
+        columns = matching.OrderColumns.from_rows([(1, 1, 4, ["10:00-11:00"]),
+                                                   (2, 1, 4, ["10:00-11:00"]),
+                                                   (3, 1, 4, ["10:00-11:00"])])
+
+        plan = dispatch.solve(couriers, columns, OrderManager.max_weight)
+
+        self.assertEqual(plan, {1: [1, 2]})
+
+
+class DispatchTests(AdmissionResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.post(path='/couriers', content_type="application/json", data={"data": [
+            {"courier_id": 1, "courier_type": "foot", "regions": [1, 2], "working_hours": ["09:00-12:00"]},
+            {"courier_id": 2, "courier_type": "foot", "regions": [1], "working_hours": ["09:00-12:00"]},
+        ]})
+        self.client.post(path='/orders', content_type="application/json", data={"data": [
+            {"order_id": 1, "weight": 5, "region": 1, "delivery_hours": ["10:00-11:00"]},
+            {"order_id": 2, "weight": 6, "region": 2, "delivery_hours": ["10:00-11:00"]},
+        ]})
+
+    def test_assignReturnsPrecomputedBatch(self):
+        Order.order_manager.dispatch_idle()
+
+        self.assertEqual(Batch.objects.count(), 2)
+        response = self.client.post(path='/orders/assign', data={"courier_id": 2},
+                                    content_type="application/json")
+        self.assertEqual(json.loads(response.content)["orders"], [{"id": 1}])
+
+    def test_skipsBusyCouriers(self):
+        self.client.post(path='/orders/assign', data={"courier_id": 1}, content_type="application/json")
+
+        plan = Order.order_manager.dispatch_idle()
+
+        self.assertNotIn(1, plan)
+
+    def test_ordersClaimedMeanwhileAreNotReported(self):
+        self.client.post(path='/couriers', content_type="application/json", data={"data": [
+            {"courier_id": 3, "courier_type": "foot", "regions": [2], "working_hours": ["09:00-12:00"]},
+        ]})
+        taken = Batch.objects.create(courier_id=3, courier_type="foot")
+        Order.objects.filter(pk=2).update(batch_id=taken.batch_id)
+
+        # the plan was computed before the concurrent claim of order 2
+        with mock.patch("apis.models.dispatch.solve", return_value={1: [2], 2: [1]}):
+            plan = Order.order_manager.dispatch_idle()
+
+        self.assertEqual(plan, {2: [1]})
+        self.assertFalse(Batch.objects.filter(courier_id=1).exists())
+
+
+class ClaimTests(AdmissionResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.post(path='/couriers', content_type="application/json", data={"data": [
+            {"courier_id": 1, "courier_type": "foot", "regions": [1], "working_hours": ["09:00-12:00"]},
+        ]})
+        self.client.post(path='/orders', content_type="application/json", data={"data": [
+            {"order_id": 1, "weight": 1, "region": 1, "delivery_hours": ["10:00-11:00"]},
+        ]})
+
+    def test_assignLeavesNoEmptyBatch(self):
+        with mock.patch("apis.models.matching.match", return_value=np.array([1])):
+            Order.objects.filter(pk=1).update(batch_id=Batch.objects.create(courier_type="foot").batch_id)
+            self.assertEqual(Order.order_manager.assign_order(1), [])
+
+        self.assertFalse(Batch.objects.filter(courier_id=1).exists())
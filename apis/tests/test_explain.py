@@ -0,0 +1,88 @@
+import json
+
+from django.test import Client, TestCase, override_settings
+
+from apis.models import Batch
+from apis.pool import order_pool
+from apis.tests.mixins import AdmissionResetMixin
+
+
+class ExplainTests(AdmissionResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.post(path='/couriers', content_type="application/json", data={"data": [
+            {"courier_id": 1, "courier_type": "foot", "regions": [1], "working_hours": ["09:00-12:00"]},
+        ]})
+        self.client.post(path='/orders', content_type="application/json", data={"data": [
+            {"order_id": 1, "weight": 4, "region": 1, "delivery_hours": ["10:00-11:00"]},
+            {"order_id": 2, "weight": 5, "region": 1, "delivery_hours": ["10:00-11:00"]},
+            {"order_id": 3, "weight": 3, "region": 1, "delivery_hours": ["10:00-11:00"]},
+            {"order_id": 4, "weight": 1, "region": 1, "delivery_hours": ["18:00-19:00"]},
+            {"order_id": 5, "weight": 1, "region": 2, "delivery_hours": ["10:00-11:00"]},
+        ]})
+
+    def explain(self, courier_id=1):
+        response = self.client.post(path='/orders/assign/explain', data={"courier_id": courier_id},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_stages(self):
+        trace = self.explain()
+
+        self.assertEqual(trace["orders"], [1, 3])
+        stages = {stage["stage"]: stage for stage in trace["tiers"][0]["stages"]}
+        self.assertEqual(stages["region"]["candidates"], 4)
+        self.assertEqual((stages["time"]["candidates"], stages["time"]["rejected_sample"]), (3, [4]))
+        self.assertEqual((stages["capacity"]["candidates"], stages["capacity"]["rejected_sample"]), (2, [2]))
+        self.assertEqual(stages["capacity"]["selected_weight"], 7)
+        self.assertGreater(stages["region"]["queries"], 0)
+        self.assertGreaterEqual(trace["total_ms"], stages["region"]["ms"])
+
+    def test_dryRun(self):
+        self.explain()
+
+        self.assertFalse(Batch.objects.exists())
+        response = self.client.post(path='/orders/assign', data={"courier_id": 1}, content_type="application/json")
+        self.assertEqual(sorted(order["id"] for order in json.loads(response.content)["orders"]), [1, 3])
+
+    def test_openBatch(self):
+        self.client.post(path='/orders/assign', data={"courier_id": 1}, content_type="application/json")
+
+        trace = self.explain()
+        self.assertEqual((trace["open_batch"], trace["orders"], trace["tiers"]),
+                         (Batch.objects.get().batch_id, [1, 3], []))
+
+    def test_unknownCourier(self):
+        response = self.client.post(path='/orders/assign/explain', data={"courier_id": 9},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalidCourierId(self):
+        for courier_id in ("x", None, [1]):
+            response = self.client.post(path='/orders/assign/explain', data={"courier_id": courier_id},
+                                        content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+
+    @override_settings(ORDER_POOL=True)
+    def test_poolMatchesDatabase(self):
+        order_pool.cache_clear()
+        self.addCleanup(order_pool.cache_clear)
+        order_pool()
+
+        trace = self.explain()
+        self.assertEqual((trace["mode"], trace["orders"]), ("pool", [1, 3]))
+        self.assertEqual(trace["tiers"][0]["stages"][0]["queries"], 0)
+
+    @override_settings(ASSIGN_PRIORITY=True)
+    def test_priorityTracesSelect(self):
+        trace = self.explain()
+
+        self.assertEqual((trace["mode"], trace["orders"]), ("priority", [1, 2]))
+        stages = trace["tiers"][0]["stages"]
+        self.assertEqual([stage["stage"] for stage in stages], ["priority"])
+        # region 1 has four free orders, read in one chunk and scanned in key order
+        self.assertEqual((stages[0]["chunks"], stages[0]["rows_fetched"], stages[0]["scanned"]), (1, 4, 4))
+        self.assertEqual((stages[0]["capacity_skipped_sample"], stages[0]["time_rejected_sample"]), ([3], [4]))
+        self.assertEqual(stages[0]["queries"], 1)
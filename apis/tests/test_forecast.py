@@ -0,0 +1,77 @@
+import json
+
+from django.test import Client, SimpleTestCase, TestCase
+
+from apis.forecast import BUCKETS, RELATIVE_ACCURACY, DurationSketch
+from apis.models import RegionForecast
+
+
+class DurationSketchTests(SimpleTestCase):
+    def test_quantileAccuracy(self):
+        sketch = DurationSketch()
+        for seconds in range(1, 1001):
+            sketch.add(seconds)
+
+        for q, exact in [(0.5, 500), (0.9, 900), (0.99, 990)]:
+            self.assertLessEqual(abs(sketch.quantile(q) - exact) / exact, RELATIVE_ACCURACY + 0.01)
+
+    def test_mergeAndFixedSize(self):
+        first, second = DurationSketch(), DurationSketch()
+        for seconds in range(10000):
+            first.add(seconds)
+            second.add(seconds * 2)
+
+        merged = DurationSketch.from_bytes(first.to_bytes()).merge(second)
+
+        self.assertEqual(merged.count, 20000)
+        self.assertEqual(len(merged.to_bytes()), 4 * BUCKETS)
+
+    def test_empty(self):
+        self.assertIsNone(DurationSketch().quantile(0.5))
+
+
+class ForecastEndpointTests(TestCase):
+    fixtures = ["assign_data.json"]
+
+    def setUp(self):
+        self.client = Client()
+
+    def complete(self, order_id, complete_time):
+        self.client.post(path='/orders/complete', content_type="application/json",
+                         data={"courier_id": 1, "order_id": order_id, "complete_time": complete_time})
+
+    def test_forecast(self):
+        # batch 2 was assigned at 18:30:00.083, order 4 was completed at 18:53:27
+        self.complete(5, "2021-03-29T19:03:27.117Z")
+        self.complete(6, "2021-03-29T19:23:27.117Z")
+        self.complete(7, "2021-03-29T19:33:27.117Z")
+
+        response = self.client.get(path='/regions/3/forecast')
+        forecast = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([hour["hour"] for hour in forecast["hours"]], [19])
+        self.assertEqual(forecast["day"]["deliveries"], 2)
+        self.assertEqual(forecast["day"]["mean_seconds"], 900)
+        self.assertEqual(forecast["day"]["throughput_per_courier"], 4)
+
+    def test_retriedCompletionCountsOnce(self):
+        self.complete(5, "2021-03-29T19:03:27.117Z")
+        for _ in range(3):
+            self.complete(6, "2021-03-29T19:23:27.117Z")
+
+        forecast = json.loads(self.client.get(path='/regions/3/forecast').content)
+        self.assertEqual(forecast["day"]["deliveries"], 1)
+
+    def test_completionWithoutTime(self):
+        response = self.client.post(path='/orders/complete', content_type="application/json",
+                                    data={"courier_id": 1, "order_id": 6})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(RegionForecast.objects.exists())
+
+    def test_noHistory(self):
+        forecast = json.loads(self.client.get(path='/regions/42/forecast').content)
+
+        self.assertEqual(forecast["hours"], [])
+        self.assertIsNone(forecast["day"]["mean_seconds"])
@@ -0,0 +1,79 @@
+import datetime
+import json
+from unittest import mock
+
+from django.test import Client, TestCase
+from django.utils import timezone
+
+from apis.models import Batch, IdempotencyKey, Order
+from apis.tests.mixins import AdmissionResetMixin
+
+
+class IdempotencyTests(AdmissionResetMixin, TestCase):
+    fixtures = ["assign_data.json"]
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+
+    def assign(self, key, courier_id=1):
+        return self.client.post(path='/orders/assign', data={"courier_id": courier_id},
+                                content_type="application/json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retryReplaysResponse(self):
+        first = self.assign("retry-1")
+
+        with mock.patch.object(Order.order_manager, "assign_order") as assign_order:
+            second = self.assign("retry-1")
+
+        assign_order.assert_not_called()
+        self.assertEqual(second.status_code, first.status_code)
+        self.assertEqual(json.loads(second.content), json.loads(first.content))
+
+    def test_retryCostsOneQuery(self):
+        self.assign("retry-2")
+
+        with self.assertNumQueries(1):
+            self.assign("retry-2")
+
+    def test_differentPayload(self):
+        self.assign("retry-3")
+
+        response = self.assign("retry-3", courier_id=2)
+
+        self.assertEqual(response.status_code, 422)
+
+    def test_inProgress(self):
+        IdempotencyKey.objects.create(key_hash="x" * 64, request_hash="y" * 64)
+
+        with mock.patch("apis.idempotency.hashes", return_value=("x" * 64, "y" * 64)):
+            response = self.assign("retry-4")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_abandonedReservationIsTakenOver(self):
+        IdempotencyKey.objects.create(key_hash="x" * 64, request_hash="y" * 64)
+        IdempotencyKey.objects.update(created_time=timezone.now() - datetime.timedelta(minutes=5))
+
+        with mock.patch("apis.idempotency.hashes", return_value=("x" * 64, "y" * 64)):
+            response = self.assign("retry-5")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 200)
+
+    def test_importRetry(self):
+        data = {"data": [{"order_id": 900, "weight": 1, "region": 1, "delivery_hours": ["09:00-18:00"]}]}
+
+        for _ in range(2):
+            response = self.client.post(path='/orders', data=data, content_type="application/json",
+                                        HTTP_IDEMPOTENCY_KEY="import-1")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content), {"orders": [{"id": 900}]})
+
+    def test_withoutKey(self):
+        self.client.post(path='/orders/assign', data={"courier_id": 1}, content_type="application/json")
+
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertTrue(Batch.objects.exists())
@@ -0,0 +1,82 @@
+import datetime
+import json
+from unittest import mock
+
+from django.db import connections
+from django.test import Client, TestCase
+from django.utils import timezone
+
+from apis.models import Batch, Courier, Order
+
+
+class ListTests(TestCase):
+    fixtures = ["courier_get_test_data.json"]
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_ordersKeysetPages(self):
+        response = self.client.get(path='/orders', data={"limit": 2})
+        first = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["order_id"] for item in first["results"]], [1, 2])
+
+        second = json.loads(self.client.get(first["next"]).content)
+        self.assertEqual([item["order_id"] for item in second["results"]], [3, 4])
+
+    def test_ordersFilters(self):
+        response = self.client.get(path='/orders', data={"batch": 2, "complete": "false"})
+
+        self.assertEqual([item["order_id"] for item in json.loads(response.content)["results"]], [5])
+
+    def test_ordersSparseFields(self):
+        response = self.client.get(path='/orders', data={"fields": "order_id,weight", "limit": 1})
+
+        self.assertEqual(json.loads(response.content)["results"], [{"order_id": 1, "weight": "1.00"}])
+
+    def test_ordersBadFilter(self):
+        response = self.client.get(path='/orders', data={"region": "abc"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_batches(self):
+        response = self.client.get(path='/batches', data={"courier": 1, "is_complete": "true",
+                                                          "fields": "batch_id"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["results"], [{"batch_id": 1}])
+
+    def test_couriersListBulkRatings(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(path='/couriers')
+
+        couriers = json.loads(response.content)["results"]
+        self.assertEqual([(item["courier_id"], item.get("rating"), item["earnings"]) for item in couriers],
+                         [(1, 4.89, 1000), (2, None, 0)])
+
+
+class BulkRatingTests(TestCase):
+    fixtures = ["courier_get_test_data.json"]
+
+    def test_bulkMatchesSingle(self):
+        batch = Batch.objects.create(courier_id=2, courier_type="bike", is_complete=True)
+        Batch.objects.filter(pk=batch.pk).update(assign_time=datetime.datetime(2021, 1, 10, 9, tzinfo=timezone.utc))
+        Order.objects.create(order_id=10, weight=1, region=1, delivery_hours=["09:00-10:00"], batch=batch,
+                             complete_time=datetime.datetime(2021, 1, 10, 9, 20, tzinfo=timezone.utc))
+
+        ratings = Courier.add_funcs.ratings()
+
+        self.assertEqual(set(ratings), {1, 2})
+        for courier_id, rating in ratings.items():
+            self.assertAlmostEqual(rating, Courier.add_funcs.rating(courier_id))
+        self.assertAlmostEqual(ratings[2], (60 - 20) / 60 * 5)
+        self.assertEqual(Courier.add_funcs.earnings_many([1, 2, 3]), {1: 1000, 2: 2500, 3: 0})
+
+    def test_singleCourierSkipsServerCursor(self):
+        connection = connections["default"]
+        with mock.patch.object(connection, "chunked_cursor", wraps=connection.chunked_cursor) as chunked_cursor:
+            self.assertAlmostEqual(Courier.add_funcs.rating(1), Courier.add_funcs.ratings()[1])
+
+        # only the bulk read of all couriers streams through the server-side cursor
+        self.assertEqual(chunked_cursor.call_count, 1)
@@ -0,0 +1,46 @@
+from django.test import SimpleTestCase
+
+from apis import matching
+
+
+class MatchingKernelTests(SimpleTestCase):
+    rows = [
+        (1, 12, 0.14, ["09:00-18:00"]),
+        (2, 1, 50, ["09:00-18:00"]),
+        (3, 22, 0.02, ["09:00-12:00", "16:00-21:30"]),
+        (10, 33, 3.7, ["07:00-09:00"]),
+        (11, 33, 2.3, ["07:00-09:00"]),
+        (12, 45, 1.4, ["07:00-09:00"]),
+        (14, 33, 49, ["07:00-09:00"]),
+    ]
+
+    def test_parseHours(self):
+        starts, ends = matching.parse_hours(["09:00-18:00", "07:30-09:15"])
+        self.assertEqual(starts.tolist(), [540, 450])
+        self.assertEqual(ends.tolist(), [1080, 555])
+
+    def test_parseHoursRejectsMalformed(self):
+        self.assertEqual(matching.parse_hours(["00:00-24:00"])[1].tolist(), [24 * 60])
+        for value in ("9:00-18:00", "09:00-18:000", "09:00 18:00", "09-00-18-00", "09:60-18:00", "23:00-24:30",
+                      "ab:cd-ef:gh", ""):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                matching.parse_hours(["07:30-09:15", value])
+
+    def test_match(self):
+        columns = matching.OrderColumns.from_rows(self.rows)
+        result = matching.match(columns, [12, 22, 23, 33], ["08:00-12:00"], 50)
+        self.assertEqual(sorted(result.tolist()), [1, 3, 10, 11])
+
+    def test_boundaryIsNotOverlap(self):
+        columns = matching.OrderColumns.from_rows([(1, 1, 1, ["12:00-13:00"])])
+        self.assertEqual(matching.match(columns, [1], ["08:00-12:00"], 10).tolist(), [])
+
+    def test_equalWeightsTakenTogether(self):
+        columns = matching.OrderColumns.from_rows([(1, 1, 4, ["09:00-10:00"]),
+                                                   (2, 1, 4, ["09:00-10:00"]),
+                                                   (3, 1, 1, ["09:00-10:00"])])
+        self.assertEqual(matching.match(columns, [1], ["09:00-10:00"], 8).tolist(), [3])
+
+    def test_empty(self):
+        columns = matching.OrderColumns.from_rows([])
+        self.assertEqual(matching.match(columns, [1], ["09:00-10:00"], 10).tolist(), [])
@@ -0,0 +1,111 @@
+import random
+from unittest import mock
+
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from apis import matching
+from apis.management.commands.bench_matching import random_hours
+from apis.models import Batch, Order
+from apis.pool import OrderPool, order_pool, slot_bitmaps
+from apis.tests.mixins import AdmissionResetMixin
+
+
+def random_rows(count, seed=7):
+    rnd = random.Random(seed)
+    return [(order_id, rnd.randint(1, 10), rnd.randint(1, 5000) / 100,
+             [random_hours(rnd) for _ in range(rnd.randint(1, 3))])
+            for order_id in range(1, count + 1)]
+
+
+class OrderPoolTests(SimpleTestCase):
+    rows = random_rows(3000)
+
+    def assertSameMatch(self, pool, rows, regions, working_hours, max_weight):
+        expected = matching.match(matching.OrderColumns.from_rows(rows), regions, working_hours, max_weight)
+        self.assertEqual(sorted(pool.match(regions, working_hours, max_weight).tolist()), sorted(expected.tolist()))
+
+    def test_slotBitmaps(self):
+        bitmaps = slot_bitmaps([0, 540, 600], [30, 601, 600])
+        self.assertEqual(bitmaps.tolist(), [0b1, 0b111 << 18, 0])
+
+    def test_matchEqualsKernel(self):
+        pool = OrderPool()
+        pool.add(self.rows)
+        for regions, working_hours in [([1, 2, 3], ["09:00-13:00", "15:00-19:00"]), ([4], ["00:00-06:30"])]:
+            self.assertSameMatch(pool, self.rows, regions, working_hours, 50)
+
+    def test_discardAndReturn(self):
+        pool = OrderPool()
+        pool.add(self.rows)
+        pool.discard(range(1, 3001, 3))
+        pool.discard([2, 100000])
+
+        self.assertEqual(len(pool), 1999)
+        self.assertNotIn(2, pool)
+        rest = [row for row in self.rows if row[0] % 3 != 1 and row[0] != 2]
+        self.assertSameMatch(pool, rest, list(range(1, 11)), ["10:00-12:00"], 50)
+
+        pool.add([self.rows[1]])
+        self.assertIn(2, pool)
+        self.assertEqual(len(pool), 2000)
+
+    def test_compactKeepsOrders(self):
+        pool = OrderPool()
+        pool.add(self.rows)
+        pool.discard(range(1, 2500))
+
+        self.assertEqual(pool.size, len(pool))
+        self.assertSameMatch(pool, self.rows[2499:], list(range(1, 11)), ["00:00-23:59"], 50)
+
+    def test_memoryPerOrder(self):
+        pool = OrderPool()
+        pool.add(self.rows)
+        self.assertLess(pool.nbytes / len(pool), 100)
+
+
+@override_settings(ORDER_POOL=True)
+# TestCase never commits, so pool updates are applied right away instead of on commit
+@mock.patch("apis.pool.transaction.on_commit", lambda func: func())
+class OrderPoolTrackingTests(AdmissionResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        order_pool.cache_clear()
+        self.client = Client()
+        self.client.post(path='/couriers', content_type="application/json", data={"data": [
+            {"courier_id": 1, "courier_type": "foot", "regions": [1], "working_hours": ["09:00-12:00"]},
+        ]})
+        self.client.post(path='/orders', content_type="application/json", data={"data": [
+            {"order_id": 1, "weight": 1, "region": 1, "delivery_hours": ["10:00-11:00"]},
+        ]})
+
+    def tearDown(self):
+        order_pool.cache_clear()
+
+    def test_createAssignRelease(self):
+        self.assertIn(1, order_pool())
+        self.client.post(path='/orders', content_type="application/json", data={"data": [
+            {"order_id": 2, "weight": 2, "region": 1, "delivery_hours": ["11:00-12:00"]},
+        ]})
+        self.assertIn(2, order_pool())
+
+        self.client.post(path='/orders/assign', data={"courier_id": 1}, content_type="application/json")
+        self.assertEqual(len(order_pool()), 0)
+
+        self.client.patch(path='/couriers/1', data={"working_hours": ["10:00-11:00"]},
+                          content_type="application/json")
+        self.assertIn(2, order_pool())
+        self.assertNotIn(1, order_pool())
+
+    def test_staleOrdersAreMatchedAgain(self):
+        self.client.post(path='/orders', content_type="application/json", data={"data": [
+            {"order_id": 2, "weight": 9.5, "region": 1, "delivery_hours": ["10:00-11:00"]},
+        ]})
+        order_pool()
+        # another worker claimed order 1 and its notification has not arrived yet
+        Order.objects.filter(pk=1).update(batch_id=Batch.objects.create(courier_type="foot").batch_id)
+
+        orders, _ = Order.order_manager.assign_order(1)
+
+        self.assertEqual(list(orders.values_list("order_id", flat=True)), [2])
+        self.assertNotIn(1, order_pool())
+        self.assertEqual(Batch.objects.filter(courier_id=1).count(), 1)
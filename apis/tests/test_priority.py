@@ -0,0 +1,97 @@
+import datetime
+import io
+import json
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from apis.models import Order
+from apis.priority import priority_key
+from apis.tests.mixins import AdmissionResetMixin
+
+
+@override_settings(ASSIGN_PRIORITY=True)
+class PriorityAssignTests(AdmissionResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.post(path='/couriers', content_type="application/json", data={"data": [
+            {"courier_id": 1, "courier_type": "foot", "regions": [1], "working_hours": ["09:00-18:00"]},
+        ]})
+
+    def post_orders(self, *orders):
+        response = self.client.post(path='/orders', content_type="application/json", data={"data": list(orders)})
+        self.assertEqual(response.status_code, 201)
+
+    def assign(self):
+        response = self.client.post(path='/orders/assign', data={"courier_id": 1}, content_type="application/json")
+        return sorted(order["id"] for order in json.loads(response.content)["orders"])
+
+    def test_explicitPriorityFirst(self):
+        # the lightest-first order would take 1 and 2; priority takes the heavy urgent order
+        self.post_orders(
+            {"order_id": 1, "weight": 1, "region": 1, "delivery_hours": ["10:00-11:00"]},
+            {"order_id": 2, "weight": 2, "region": 1, "delivery_hours": ["10:00-11:00"]},
+            {"order_id": 3, "weight": 9, "region": 1, "delivery_hours": ["10:00-11:00"], "priority": 5},
+        )
+        self.assertEqual(self.assign(), [1, 3])
+
+    def test_oldOrderIsNotStarved(self):
+        self.post_orders(
+            {"order_id": 1, "weight": 9, "region": 1, "delivery_hours": ["10:00-11:00"]},
+            {"order_id": 2, "weight": 9, "region": 1, "delivery_hours": ["10:00-11:00"], "priority": 1},
+        )
+        order = Order.objects.get(pk=1)
+        order.created_time -= datetime.timedelta(hours=2)
+        order.save()
+
+        self.assertEqual(self.assign(), [1])
+
+    def test_tighterDeadlineFirst(self):
+        self.post_orders(
+            {"order_id": 1, "weight": 9, "region": 1, "delivery_hours": ["16:00-17:00"]},
+            {"order_id": 2, "weight": 9, "region": 1, "delivery_hours": ["09:00-10:00"]},
+            {"order_id": 3, "weight": 9, "region": 1, "delivery_hours": ["07:00-08:00"], "priority": 9},
+        )
+        # order 3 is urgent but outside working hours
+        self.assertEqual(self.assign(), [2])
+
+    def test_reprioritize(self):
+        self.post_orders({"order_id": 1, "weight": 1, "region": 1, "delivery_hours": ["10:00-11:00"], "priority": 2})
+        Order.objects.update(priority_key=0)
+
+        with override_settings(ASSIGN_PRIORITY_WEIGHTS={"priority": 100, "age": 0, "deadline": 0}):
+            call_command("reprioritize_orders", stdout=io.StringIO())
+            self.assertEqual(Order.objects.get().priority_key, 200)
+
+    def test_mergesRegionsInKeyOrder(self):
+        self.client.patch(path='/couriers/1', data={"regions": [1, 2, 3]}, content_type="application/json")
+        self.post_orders(
+            {"order_id": 1, "weight": 4, "region": 3, "delivery_hours": ["10:00-11:00"], "priority": 1},
+            {"order_id": 2, "weight": 4, "region": 1, "delivery_hours": ["10:00-11:00"], "priority": 3},
+            {"order_id": 3, "weight": 4, "region": 2, "delivery_hours": ["10:00-11:00"], "priority": 2},
+        )
+        self.assertEqual(self.assign(), [2, 3])
+
+    @override_settings(ASSIGN_PRIORITY_SCAN=3)
+    def test_scanLimitAcrossChunks(self):
+        self.post_orders(*[{"order_id": order_id, "weight": 1, "region": 1, "delivery_hours": ["08:00-09:00"]}
+                           for order_id in range(1, 4)] +
+                         [{"order_id": 4, "weight": 1, "region": 1, "delivery_hours": ["16:00-17:00"]}])
+        with mock.patch("apis.priority.CHUNK_SIZE", 2):
+            self.assertEqual(self.assign(), [])
+        with override_settings(ASSIGN_PRIORITY_SCAN=4), mock.patch("apis.priority.CHUNK_SIZE", 2):
+            self.assertEqual(self.assign(), [4])
+
+
+class PriorityKeyTests(TestCase):
+    def test_keyOrdersByScore(self):
+        now = timezone.now()
+        urgent = priority_key(1, now, ["12:00-13:00"])
+        old = priority_key(0, now - datetime.timedelta(minutes=61), ["12:00-13:00"])
+        late = priority_key(0, now, ["18:00-19:00"])
+
+        self.assertGreater(old, urgent)
+        self.assertGreater(urgent, late)
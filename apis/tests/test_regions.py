@@ -0,0 +1,56 @@
+import json
+
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from apis.models import RegionAdjacency
+from apis.regions import RegionGraph, region_graph
+from apis.tests.mixins import AdmissionResetMixin
+
+
+class RegionGraphTests(SimpleTestCase):
+    graph = RegionGraph.from_edges([(1, 2), (2, 3), (3, 4), (2, 1), (5, 5), (10, 1)])
+
+    def test_neighbours(self):
+        self.assertEqual(self.graph.neighbours(2).tolist(), [1, 3])
+        self.assertEqual(self.graph.neighbours(1).tolist(), [2, 10])
+        self.assertEqual(self.graph.neighbours(99).tolist(), [])
+
+    def test_rings(self):
+        self.assertEqual(self.graph.rings([1], 3), [[2, 10], [3], [4]])
+        self.assertEqual(self.graph.rings([1], 1), [[2, 10]])
+
+    def test_empty(self):
+        self.assertEqual(RegionGraph.from_edges([]).rings([1], 2), [])
+
+
+class NeighbourFallbackTests(AdmissionResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.post(path='/couriers', content_type="application/json", data={"data": [
+            {"courier_id": 1, "courier_type": "foot", "regions": [1], "working_hours": ["09:00-12:00"]},
+        ]})
+        self.client.post(path='/orders', content_type="application/json", data={"data": [
+            {"order_id": 1, "weight": 1, "region": 2, "delivery_hours": ["10:00-11:00"]},
+            {"order_id": 2, "weight": 1, "region": 3, "delivery_hours": ["10:00-11:00"]},
+        ]})
+        RegionAdjacency.objects.create(region=1, neighbour=2)
+        RegionAdjacency.objects.create(region=3, neighbour=2)
+
+    def assign(self):
+        response = self.client.post(path='/orders/assign', data={"courier_id": 1}, content_type="application/json")
+        return [order["id"] for order in json.loads(response.content)["orders"]]
+
+    def test_disabledByDefault(self):
+        self.assertEqual(self.assign(), [])
+
+    @override_settings(ASSIGN_NEIGHBOUR_HOPS=2)
+    def test_nearestRingWins(self):
+        self.assertEqual(self.assign(), [1])
+
+    @override_settings(ASSIGN_NEIGHBOUR_HOPS=2)
+    def test_graphReloadsAfterChange(self):
+        RegionAdjacency.objects.filter(region=1).delete()
+
+        self.assertEqual(region_graph().neighbours(1).tolist(), [])
+        self.assertEqual(self.assign(), [])
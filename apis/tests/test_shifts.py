@@ -0,0 +1,114 @@
+import datetime
+import io
+import json
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from apis import shifts
+from apis.models import AvailabilityWindow, Order, ShiftOverride, ShiftTemplate
+from apis.tests.mixins import AdmissionResetMixin
+
+
+@override_settings(SHIFT_CALENDAR=True, SHIFT_HORIZON_DAYS=7)
+class ShiftCalendarTests(AdmissionResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.today = timezone.localdate()
+        self.client.post(path='/couriers', content_type="application/json", data={"data": [
+            {"courier_id": 1, "courier_type": "foot", "regions": [1, 2], "working_hours": ["09:00-12:00"]},
+            {"courier_id": 2, "courier_type": "foot", "regions": [1], "working_hours": ["00:00-24:00"]},
+        ]})
+        self.client.post(path='/orders', content_type="application/json", data={"data": [
+            {"order_id": 1, "weight": 1, "region": 1, "delivery_hours": ["10:00-11:00"]},
+            {"order_id": 2, "weight": 1, "region": 1, "delivery_hours": ["18:00-19:00"]},
+        ]})
+
+    def assign(self, courier_id):
+        response = self.client.post(path='/orders/assign', data={"courier_id": courier_id},
+                                    content_type="application/json")
+        return sorted(order["id"] for order in json.loads(response.content)["orders"])
+
+    def test_workingHoursEveryDay(self):
+        # a window per day and region
+        self.assertEqual(AvailabilityWindow.objects.filter(courier_id=1).count(), 14)
+        self.assertEqual(shifts.working_hours([1, 2]), {1: ["09:00-12:00"], 2: ["00:00-24:00"]})
+
+    def test_templateAndOverride(self):
+        tomorrow = self.today + datetime.timedelta(days=1)
+        ShiftTemplate.objects.create(courier_id=1, weekday=self.today.weekday(), start=17 * 60, end=20 * 60)
+        ShiftTemplate.objects.create(courier_id=1, weekday=tomorrow.weekday(), start=8 * 60, end=10 * 60)
+        ShiftOverride.objects.create(courier_id=1, date=tomorrow)
+
+        self.assertEqual(shifts.working_hours([1]), {1: ["17:00-20:00"]})
+        self.assertEqual(shifts.working_hours([1], tomorrow), {1: []})
+        self.assertEqual(self.assign(1), [2])
+
+        ShiftOverride.objects.create(courier_id=1, date=self.today)
+        self.assertEqual(shifts.working_hours([1]), {1: []})
+
+    def test_updateRegenerates(self):
+        self.client.patch(path='/couriers/1', data={"regions": [3], "working_hours": ["17:00-20:00"]},
+                          content_type="application/json")
+
+        self.assertEqual(set(AvailabilityWindow.objects.filter(courier_id=1).values_list("region", flat=True)), {3})
+        self.assertEqual(shifts.working_hours([1]), {1: ["17:00-20:00"]})
+
+    def test_bulkImportMaterializesOnce(self):
+        with mock.patch("apis.shifts.materialize", wraps=shifts.materialize) as materialize:
+            self.client.post(path='/couriers', content_type="application/json", data={"data": [
+                {"courier_id": courier_id, "courier_type": "foot", "regions": [1], "working_hours": ["09:00-12:00"]}
+                for courier_id in (3, 4, 5)
+            ]})
+
+        materialize.assert_called_once()
+        self.assertEqual(sorted(courier.courier_id for courier in materialize.call_args[0][0]), [3, 4, 5])
+        self.assertEqual(shifts.working_hours([3, 5]), {3: ["09:00-12:00"], 5: ["09:00-12:00"]})
+
+    def test_availableInRegion(self):
+        moment = shifts.day_start(self.today) + datetime.timedelta(hours=10)
+
+        available = shifts.available([2], moment, moment + datetime.timedelta(minutes=1))
+        self.assertEqual([row["courier_id"] for row in available], [1])
+        available = shifts.available([1], moment + datetime.timedelta(hours=3), moment + datetime.timedelta(hours=4))
+        self.assertEqual([row["courier_id"] for row in available], [2])
+
+    def test_dispatchSkipsCouriersOffShift(self):
+        ShiftOverride.objects.create(courier_id=2, date=self.today)
+        ShiftOverride.objects.create(courier_id=1, date=self.today, start=0, end=24 * 60)
+
+        plan = Order.order_manager.dispatch_idle()
+        self.assertEqual(plan, {1: [1, 2]})
+
+    def test_notMaterializedCourierUsesWorkingHours(self):
+        # created while the calendar was off
+        with override_settings(SHIFT_CALENDAR=False):
+            self.client.post(path='/couriers', content_type="application/json", data={"data": [
+                {"courier_id": 3, "courier_type": "foot", "regions": [1], "working_hours": ["17:00-20:00"]},
+            ]})
+        ShiftOverride.objects.create(courier_id=1, date=self.today)
+        ShiftOverride.objects.create(courier_id=2, date=self.today)
+
+        self.assertFalse(AvailabilityWindow.objects.filter(courier_id=3).exists())
+        self.assertEqual(shifts.working_hours([1, 3]), {1: [], 3: ["17:00-20:00"]})
+        self.assertEqual(Order.order_manager.dispatch_idle(), {3: [2]})
+
+    def test_invalidShiftsAreRejected(self):
+        for model, fields in ((ShiftTemplate, {"weekday": 0, "start": -1, "end": 60}),
+                              (ShiftTemplate, {"weekday": 0, "start": 600, "end": 600}),
+                              (ShiftTemplate, {"weekday": 0, "start": 600, "end": 24 * 60 + 1}),
+                              (ShiftTemplate, {"weekday": 7, "start": 0, "end": 60}),
+                              (ShiftOverride, {"date": self.today, "start": 600})):
+            with self.subTest(model=model.__name__, **fields), self.assertRaises(IntegrityError), \
+                    transaction.atomic():
+                model.objects.create(courier_id=1, **fields)
+
+    def test_command(self):
+        AvailabilityWindow.objects.all().delete()
+
+        call_command("materialize_shifts", "--days", "2", stdout=io.StringIO())
+        self.assertEqual(AvailabilityWindow.objects.count(), 6)
@@ -0,0 +1,22 @@
+from django.test import SimpleTestCase
+
+from apis.startup import heaviest_imports, timed_import_module
+
+REPORT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   numpy.core
+import time:      3000 |     105000 | numpy
+import time:       300 |        300 | json
+import time:      1000 |      12000 | apis.models
+"""
+
+
+class StartupProfileTests(SimpleTestCase):
+    def test_heaviestImports(self):
+        self.assertEqual(heaviest_imports(REPORT, limit=2), [("numpy", 105.0), ("apis.models", 12.0)])
+
+    def test_timedImportModule(self):
+        times = {}
+        module = timed_import_module(times)("apis.startup")
+
+        self.assertEqual(module.__name__, "apis.startup")
+        self.assertGreaterEqual(times["apis.startup"], 0)
@@ -0,0 +1,60 @@
+import io
+import json
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+
+from apis import matching, normalized
+from apis.models import Courier, CourierRegion, Order, OrderWindow
+from apis.tests.mixins import AdmissionResetMixin
+
+
+class PortableArrayTests(TestCase):
+    def test_roundTrip(self):
+        Courier.objects.create(courier_id=1, courier_type="foot", regions=[1, 12], working_hours=["09:00-11:00"])
+
+        courier = Courier.objects.get(pk=1)
+        self.assertEqual(courier.regions, [1, 12])
+        self.assertEqual(list(Courier.objects.values_list("working_hours", flat=True)), [["09:00-11:00"]])
+
+
+@override_settings(NORMALIZED_SCHEMA=True)
+class NormalizedSchemaTests(AdmissionResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.post(path='/couriers', content_type="application/json", data={"data": [
+            {"courier_id": 1, "courier_type": "foot", "regions": [1, 2], "working_hours": ["09:00-12:00"]},
+        ]})
+        self.client.post(path='/orders', content_type="application/json", data={"data": [
+            {"order_id": 1, "weight": 1, "region": 1, "delivery_hours": ["10:00-11:00", "18:00-19:30"]},
+            {"order_id": 2, "weight": 2.5, "region": 2, "delivery_hours": ["08:00-09:00"]},
+            {"order_id": 3, "weight": 3, "region": 3, "delivery_hours": ["11:30-12:00"]},
+        ]})
+
+    def test_childRowsFollowArrays(self):
+        self.assertEqual(list(OrderWindow.objects.filter(order_id=1).order_by("start").values_list("start", "end")),
+                         [(600, 660), (1080, 1170)])
+
+        self.client.patch(path='/couriers/1', data={"regions": [3]}, content_type="application/json")
+        self.assertEqual(list(CourierRegion.objects.values_list("region", flat=True)), [3])
+
+    def test_columnsMatchArrays(self):
+        expected = matching.OrderColumns.from_queryset(Order.objects.order_by("order_id"))
+        columns = normalized.order_columns(Order.objects.all())
+
+        for name in expected.__slots__:
+            self.assertEqual(getattr(columns, name).tolist(), getattr(expected, name).tolist())
+
+    def test_assign(self):
+        response = self.client.post(path='/orders/assign', data={"courier_id": 1}, content_type="application/json")
+        self.assertEqual([order["id"] for order in json.loads(response.content)["orders"]], [1])
+
+    def test_backfill(self):
+        OrderWindow.objects.all().delete()
+        CourierRegion.objects.all().delete()
+
+        call_command("normalize_schema", stdout=io.StringIO())
+
+        self.assertEqual(OrderWindow.objects.count(), 4)
+        self.assertEqual(sorted(CourierRegion.objects.values_list("region", flat=True)), [1, 2])
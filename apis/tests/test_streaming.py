@@ -0,0 +1,189 @@
+import asyncio
+import json
+import queue
+import threading
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from apis.management.commands.bench_events import idle_connections
+from apis.notifications import InProcessBroker, PostgresBroker, broker, courier_channel
+from apis.streaming import EventStreamRouter
+
+
+async def not_django(scope, receive, send):
+    raise AssertionError("request should not reach Django")
+
+
+async def stream(path, until_events, on_connect=None):
+    """
+    Открывает поток событий, вызывает on_connect и собирает until_events событий
+    """
+    sent = []
+    closed = asyncio.Event()
+    events = asyncio.Event()
+
+    async def receive():
+        await closed.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message.get("body", b"").startswith(b": connected") and on_connect:
+            await asyncio.get_running_loop().run_in_executor(None, on_connect)
+        if sum(message.get("body", b"").startswith(b"event:") for message in sent) >= until_events:
+            events.set()
+
+    async def close_after_events():
+        await asyncio.wait_for(events.wait(), timeout=5)
+        closed.set()
+
+    await asyncio.gather(EventStreamRouter(not_django)({"type": "http", "method": "GET", "path": path},
+                                                       receive, send),
+                         close_after_events())
+    return sent
+
+
+class InProcessBrokerMixin:
+    """
+    Поток и точки публикации проверяются на брокере в памяти, доставка между процессами - в PostgresBrokerTests
+    """
+
+    def setUp(self):
+        super().setUp()
+        broker.cache_clear()
+        patcher = override_settings(NOTIFICATIONS_BROKER="apis.notifications.InProcessBroker")
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.addCleanup(broker.cache_clear)
+
+
+class BrokerTests(SimpleTestCase):
+    def test_publishSubscribe(self):
+        local = InProcessBroker()
+        received = []
+        local.subscribe("a", received.append)
+
+        local.publish("a", "1")
+        local.publish("b", "2")
+        local.unsubscribe("a", received.append)
+        local.publish("a", "3")
+
+        self.assertEqual(received, ["1"])
+        self.assertEqual(local.subscribers(), 0)
+
+
+class SlowListenBroker(InProcessBroker):
+    """
+    Брокер, который начинает доставлять события не сразу после подписки, как PostgresBroker до LISTEN
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.listening = threading.Event()
+
+    def subscribe(self, channel, callback):
+        super().subscribe(channel, callback)
+        return self.listening
+
+
+@override_settings(SSE_HEARTBEAT=5)
+class StreamTests(InProcessBrokerMixin, TestCase):
+    fixtures = ["assign_data.json"]
+
+    def test_unknownCourier(self):
+        sent = []
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        async_to_sync(EventStreamRouter(not_django))({"type": "http", "method": "GET", "path": "/couriers/404/events"},
+                                                     receive, send)
+
+        self.assertEqual(sent[0]["status"], 404)
+
+    def test_eventIsStreamed(self):
+        message = json.dumps({"event": "completed", "order_id": 3})
+
+        sent = async_to_sync(stream)("/couriers/1/events", 1,
+                                     on_connect=lambda: broker().publish(courier_channel(1), message))
+
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), sent[0]["headers"])
+        self.assertEqual(sent[-1]["body"], ("event: completed\ndata: %s\n\n" % message).encode())
+        self.assertEqual(broker().subscribers(), 0)
+
+
+    def test_streamWaitsForListenerOffTheLoop(self):
+        slow = SlowListenBroker()
+        connected = []
+        message = json.dumps({"event": "completed", "order_id": 3})
+
+        def on_connect():
+            connected.append(slow.listening.is_set())
+            slow.publish(courier_channel(1), message)
+
+        async def start_listening():
+            # runs only if the stream does not block the event loop while it waits
+            await asyncio.sleep(0.05)
+            slow.listening.set()
+
+        async def scenario():
+            return (await asyncio.gather(stream("/couriers/1/events", 1, on_connect), start_listening()))[0]
+
+        with mock.patch("apis.streaming.broker", return_value=slow):
+            sent = async_to_sync(scenario)()
+
+        self.assertEqual(connected, [True])
+        self.assertEqual(sent[-1]["body"], ("event: completed\ndata: %s\n\n" % message).encode())
+
+
+class IdleConnectionTests(InProcessBrokerMixin, SimpleTestCase):
+    def test_manyIdleConnections(self):
+        # bench_events runs the same scenario with 10k connections
+        with mock.patch("apis.streaming.courier_exists", return_value=True):
+            result = async_to_sync(idle_connections)(1000, 1)
+
+        self.assertLess(result["bytes_per_connection"], 32 * 1024)
+        self.assertEqual(broker().subscribers(), 0)
+
+
+class PublishTests(InProcessBrokerMixin, TransactionTestCase):
+    fixtures = ["assign_data.json"]
+
+    def test_patchAndCompletePublish(self):
+        received = []
+        broker().subscribe(courier_channel(1), received.append)
+        self.addCleanup(broker().unsubscribe, courier_channel(1), received.append)
+        client = Client()
+
+        client.patch(path='/couriers/1', data={"regions": [1, 2]}, content_type="application/json")
+        client.post(path='/orders/complete', content_type="application/json",
+                    data={"courier_id": 1, "order_id": 5, "complete_time": "2021-03-29T19:00:00.00Z"})
+
+        removed, completed = [json.loads(message) for message in received]
+        self.assertEqual(removed["event"], "removed")
+        self.assertEqual(sorted(removed["orders"]), [6, 7])
+        self.assertEqual(completed, {"event": "completed", "order_id": 5, "batch_complete": True})
+
+
+@skipUnless(connection.vendor == "postgresql", "LISTEN/NOTIFY needs Postgres")
+class PostgresBrokerTests(SimpleTestCase):
+    databases = {"default"}
+
+    def test_eventCrossesConnections(self):
+        postgres = PostgresBroker()
+        self.addCleanup(postgres.stop)
+        received = queue.Queue()
+        self.assertTrue(postgres.subscribe(courier_channel(1), received.put).wait(5))
+
+        postgres.publish(courier_channel(2), "other")
+        postgres.publish(courier_channel(1), "mine")
+
+        self.assertEqual(received.get(timeout=5), "mine")
+        self.assertTrue(received.empty())
@@ -1,17 +1,25 @@
 from rest_framework import status
 from rest_framework import viewsets, permissions
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 
-from .models import Courier, Order
+from .admission import admission_controlled, assign_controller
+from .db_router import is_pinned, pin_courier, use_primary
+from .explain import explain_assignment
+from .filters import QueryParamFilter, SparseFieldsFilter, boolean
+from .forecast import region_forecast
+from .idempotency import idempotent, replayed
+from .models import Batch, Courier, Order
+from .pagination import KeysetPagination
 from .serializers import CourierSerializer, OrderSerializer, OrderIdSerializer, CourierPostSerializer, \
-    OrderPostSerializer
+    OrderPostSerializer, OrderListSerializer, BatchSerializer
 
 
 class CourierView(viewsets.ModelViewSet):
     queryset = Courier.objects.all()
     serializer_class = CourierSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
 
     def update(self, request, *args, **kwargs):
 
@@ -24,6 +32,7 @@ class CourierView(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
         Order.order_manager.check_after_update(instance)
+        pin_courier(instance.courier_id)
 
         if getattr(instance, '_prefetched_objects_cache', None):
             # If 'prefetch_related' has been applied to a queryset, we need to
@@ -33,13 +42,20 @@ class CourierView(viewsets.ModelViewSet):
             {key: serializer.data[key] for key in serializer.data.keys() if key not in ["earnings", "rating"]}
         )
 
+    def retrieve(self, request, *args, **kwargs):
+        if is_pinned(kwargs.get(self.lookup_field)):
+            with use_primary():
+                return super().retrieve(request, *args, **kwargs)
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         return {'couriers': [{'id': instance.get('courier_id')} for instance in serializer.save().get("data")]}
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         problems = []
         for item in request.data["data"]:
-            if not set([f.name for f in Courier._meta.get_fields()][1:]) == set(item.keys()):
+            if not {f.name for f in Courier._meta.concrete_fields} == set(item.keys()):
                 problems.append({"id": int(item["courier_id"])})
                 request.data["data"].remove(item)
         serializer = CourierPostSerializer(data=request.data)
@@ -60,14 +76,28 @@ class OrderView(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
+    filter_backends = [QueryParamFilter, SparseFieldsFilter]
+    filter_params = {
+        "region": ("region", int),
+        "batch": ("batch_id", int),
+        "complete": ("complete_time__isnull", lambda value: not boolean(value)),
+    }
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return OrderListSerializer
+        return super().get_serializer_class()
 
     def perform_create(self, serializer):
         return {'orders': [{'id': instance.get('order_id')} for instance in serializer.save().get("data")]}
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         problems = []
         for item in request.data["data"]:
-            if not set([f for f in ["order_id", "weight", "region", "delivery_hours"]]) == set(item.keys()):
+            # priority is the only optional field of an order
+            if not set(item.keys()) - {"priority"} == {"order_id", "weight", "region", "delivery_hours"}:
                 problems.append({"id": int(item["order_id"])})
                 request.data["data"].remove(item)
         serializer = OrderPostSerializer(data=request.data)
@@ -84,8 +114,14 @@ class OrderView(viewsets.ModelViewSet):
                         headers=headers)
 
     @action(detail=True, methods=["post"])
+    # a replay is answered with one read before it can take a token or a slot, the key is reserved once admitted
+    @replayed
+    @admission_controlled
+    @idempotent
     def assign(self, request):
         result = Order.order_manager.assign_order(request.data.get("courier_id"))
+        if result is not None:
+            pin_courier(request.data.get("courier_id"))
         if result is None:
             return Response(status=status.HTTP_400_BAD_REQUEST)
         elif isinstance(result, list):
@@ -98,10 +134,50 @@ class OrderView(viewsets.ModelViewSet):
                 data={"orders": serializer.data, "assign_time": time.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-4] + "Z"},
                 headers=headers)
 
+    @action(detail=True, methods=["post"], url_path="assign/explain", url_name="assign-explain")
+    def explain(self, request):
+        # dry run of assign: nothing is written, so neither admission control nor idempotency keys apply
+        trace = explain_assignment(request.data.get("courier_id"))
+        if trace is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        return Response(data=trace)
+
     @action(detail=True, methods=["post"])
+    @idempotent
     def complete(self, request):
         completed = Order.order_manager.complete_order(request.data)
         if completed:
+            pin_courier(completed.batch.courier_id)
             return Response(data={"order_id": completed.order_id})
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+class BatchView(viewsets.ReadOnlyModelViewSet):
+    queryset = Batch.objects.all()
+    serializer_class = BatchSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
+    filter_backends = [QueryParamFilter, SparseFieldsFilter]
+    filter_params = {
+        "courier": ("courier_id", int),
+        "is_complete": ("is_complete", boolean),
+    }
+
+
+class RegionView(viewsets.ViewSet):
+    permission_classes = [permissions.AllowAny]
+
+    @action(detail=True, methods=["get"])
+    def forecast(self, request, pk=None):
+        try:
+            region = int(pk)
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        return Response(data=region_forecast(region))
+
+
+@api_view(["GET"])
+@permission_classes([permissions.AllowAny])
+def admission_metrics(request):
+    return Response(data=assign_controller().metrics())
@@ -13,4 +13,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'candy_delivery_app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from apis.streaming import EventStreamRouter  # noqa: E402  needs the apps registry populated above
+
+application = EventStreamRouter(django_application)
@@ -25,7 +25,7 @@ DEBUG = int(os.environ.get("DEBUG", default=0))
 
 # 'DJANGO_ALLOWED_HOSTS' should be a single string of hosts with a space between each.
 # For example: 'DJANGO_ALLOWED_HOSTS=localhost 127.0.0.1 [::1]'
-ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS").split(" ")
+ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS", "localhost 127.0.0.1 [::1]").split(" ")
 
 # Application definition
 
@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apis.db_router.PrimaryPinMiddleware',
 ]
 
 ROOT_URLCONF = 'candy_delivery_app.urls'
@@ -85,6 +86,88 @@ DATABASES = {
     }
 }
 
+# 'SQL_REPLICA_HOSTS' should be a single string of read-replica hosts with a space between each.
+# Reads go to replicas, writes and read-your-writes requests go to 'default'.
+for number, host in enumerate(os.environ.get("SQL_REPLICA_HOSTS", "").split()):
+    DATABASES["replica_%d" % number] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": os.environ.get("SQL_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["apis.db_router.ReplicaRouter"]
+
+# the read-your-writes pin has to be seen by every worker, so with replicas it is kept in a table on the primary
+# (create it with 'python manage.py createcachetable'); the router refuses per-process caches when replicas are set
+if any(alias.startswith("replica") for alias in DATABASES):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": os.environ.get("CACHE_TABLE", "apis_cache"),
+        }
+    }
+
+# how long a courier's reads stay on the primary after a write
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+# how long a response is replayed for a repeated Idempotency-Key
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+# a reservation without a response older than this is treated as abandoned by a killed worker and taken over
+# by the retry; keep it above the gunicorn worker timeout
+IDEMPOTENCY_LEASE = int(os.environ.get("IDEMPOTENCY_LEASE", 60))
+
+# admission control for /orders/assign: concurrent calls per process, seconds a call may wait for a slot,
+# and the per-courier token bucket (requests per second and burst size). The concurrency limit only matters
+# when it is below the gunicorn threads per worker (GUNICORN_THREADS, 8 by default): the remaining threads stay
+# free for reads and completions; with sync workers only the token bucket applies. Buckets live in each worker process
+# and are not shared, so a courier spread over all workers gets up to ASSIGN_RATE * workers requests per second
+# and ASSIGN_BURST * workers in a burst; divide by the gunicorn worker count when sizing them
+ASSIGN_MAX_CONCURRENCY = int(os.environ.get("ASSIGN_MAX_CONCURRENCY", 4))
+ASSIGN_QUEUE_BUDGET = float(os.environ.get("ASSIGN_QUEUE_BUDGET", 0.5))
+ASSIGN_RATE = float(os.environ.get("ASSIGN_RATE", 1))
+ASSIGN_BURST = int(os.environ.get("ASSIGN_BURST", 10))
+
+# courier event stream (GET /couriers/{id}/events, served by the ASGI app under uvicorn): pub/sub broker class,
+# seconds between keepalive comments and events buffered per connection. The API workers and the event stream
+# are separate processes, so on Postgres events go through LISTEN/NOTIFY
+NOTIFICATIONS_BROKER = os.environ.get(
+    "NOTIFICATIONS_BROKER",
+    "apis.notifications.PostgresBroker" if DATABASES["default"]["ENGINE"].endswith("postgresql")
+    else "apis.notifications.InProcessBroker")
+SSE_HEARTBEAT = float(os.environ.get("SSE_HEARTBEAT", 15))
+SSE_QUEUE_SIZE = int(os.environ.get("SSE_QUEUE_SIZE", 100))
+
+# when a courier's own regions have no suitable orders, search regions up to this many hops away (0 - off)
+ASSIGN_NEIGHBOUR_HOPS = int(os.environ.get("ASSIGN_NEIGHBOUR_HOPS", 0))
+
+# take courier hours from the shift calendar (weekly templates and date overrides) materialized
+# SHIFT_HORIZON_DAYS ahead instead of the flat working_hours; dispatch only considers couriers
+# available within SHIFT_LOOKAHEAD_MINUTES
+SHIFT_CALENDAR = bool(int(os.environ.get("SHIFT_CALENDAR", 0)))
+SHIFT_HORIZON_DAYS = int(os.environ.get("SHIFT_HORIZON_DAYS", 7))
+SHIFT_LOOKAHEAD_MINUTES = int(os.environ.get("SHIFT_LOOKAHEAD_MINUTES", 60))
+
+# assign orders by priority (explicit priority, age, time left in the delivery window) instead of lightest first;
+# weights are minutes of age one unit is worth, changing them requires manage.py reprioritize_orders
+# (migration 0010 computes the keys of orders created before priorities existed)
+ASSIGN_PRIORITY = bool(int(os.environ.get("ASSIGN_PRIORITY", 0)))
+ASSIGN_PRIORITY_WEIGHTS = {"priority": 60, "age": 1, "deadline": 1}
+ASSIGN_PRIORITY_SCAN = int(os.environ.get("ASSIGN_PRIORITY_SCAN", 500))
+
+# also keep courier regions and order delivery windows (in minutes) in child tables and match orders from them,
+# fill existing data with manage.py normalize_schema before turning it on
+NORMALIZED_SCHEMA = bool(int(os.environ.get("NORMALIZED_SCHEMA", 0)))
+
+# in-memory pool of unassigned orders for assign and dispatch, kept separately in every process
+ORDER_POOL = bool(int(os.environ.get("ORDER_POOL", 0)))
+
+# Postgres LISTEN/NOTIFY feed that keeps per-process caches (order pool, region graph) coherent between workers,
+# required when ORDER_POOL is on and several processes serve the API
+CHANGEFEED = bool(int(os.environ.get("CHANGEFEED", 0)))
+CHANGEFEED_BATCH_DELAY = float(os.environ.get("CHANGEFEED_BATCH_DELAY", 0.05))
+CHANGEFEED_TIMEOUT = 1
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
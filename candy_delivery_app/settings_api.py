@@ -0,0 +1,29 @@
+"""
+Облегчённый профиль настроек для API-воркеров.
+
+API не имеет состояния и отвечает только JSON с AllowAny, поэтому админка, сессии, сообщения, статика, шаблоны
+и аутентификация DRF воркеру не нужны. Запуск: DJANGO_SETTINGS_MODULE=candy_delivery_app.settings_api.
+Миграции и manage.py-команды по-прежнему выполняются с полным профилем candy_delivery_app.settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'rest_framework',
+    'apis.apps.ApisConfig',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'apis.db_router.PrimaryPinMiddleware',
+]
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'DEFAULT_PARSER_CLASSES': ['rest_framework.parsers.JSONParser'],
+    'UNAUTHENTICATED_USER': None,
+}
@@ -1,7 +1,7 @@
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 from apis import views
-from apis.routers import CourierRouter, OrdersRouter
+from apis.routers import BatchRouter, CourierRouter, OrdersRouter, RegionRouter
 
 
 
@@ -11,8 +11,22 @@ courier_router.register(r'couriers', views.CourierView)
 order_router = OrdersRouter()
 order_router.register(r'orders', views.OrderView)
 
+batch_router = BatchRouter()
+batch_router.register(r'batches', views.BatchView)
+
+region_router = RegionRouter()
+region_router.register(r'regions', views.RegionView, basename='region')
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('', include(order_router.urls)),
     path('', include(courier_router.urls)),
+    path('', include(batch_router.urls)),
+    path('', include(region_router.urls)),
+    path('metrics/admission', views.admission_metrics),
 ]
+
+# the lean API profile (settings_api) runs without the admin
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.append(path('admin/', admin.site.urls))
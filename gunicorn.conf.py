@@ -0,0 +1,26 @@
+"""
+Конфигурация gunicorn для API-воркеров: gunicorn candy_delivery_app.wsgi -c gunicorn.conf.py
+
+Приложение импортируется в мастере до fork (preload_app), поэтому воркеры получают уже загруженные модули.
+Каждый воркер обслуживает GUNICORN_THREADS запросов в потоках (gthread).
+Если задан PRELOAD_MATCHING_INDEXES, каждый воркер сразу после fork прогревает граф регионов и ядро подбора,
+чтобы не делать это на первом запросе.
+"""
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "candy_delivery_app.settings_api")
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8080")
+workers = int(os.environ.get("GUNICORN_WORKERS", 2 * os.cpu_count() + 1))
+preload_app = True
+# gthread workers: requests of one process run in parallel threads, so ASSIGN_MAX_CONCURRENCY (kept below this)
+# actually bounds how many of them can sit in assign_order at once
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+
+def post_fork(server, worker):
+    if os.environ.get("PRELOAD_MATCHING_INDEXES"):
+        from apis.startup import preload
+
+        # database connections must not be shared with the master, so preloading happens after fork
+        preload()